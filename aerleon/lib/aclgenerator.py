@@ -316,14 +316,17 @@ class ACLGenerator:
                 err = []
                 warn = []
                 for el, val in term.__dict__.items():
+                    # Most attributes are unset, and unset attributes are always valid.
+                    if not val:
+                        continue
                     # Private attributes do not need to be valid keywords.
-                    if val and el not in supported_tokens and not el.startswith('flatten'):
-                        if val and el not in self.WARN_IF_UNSUPPORTED:
+                    if el not in supported_tokens and not el.startswith('flatten'):
+                        if el not in self.WARN_IF_UNSUPPORTED:
                             err.append(el)
                         else:
                             warn.append(el)
                     # ignore Liskov's rule.
-                    if val and isinstance(val, list) and el in supported_sub_tokens:
+                    if isinstance(val, list) and el in supported_sub_tokens:
                         ns = set(val) - supported_sub_tokens[el]
                         # hack support for ArbitraryOptions in junos. todo, add the
                         # junos options into the lexer, then we can nuke .*
@@ -65,6 +65,7 @@ class Addressbook:
 
         if zone not in self.addressbook:
             self.addressbook[zone] = collections.defaultdict(list)
+        zone_book = self.addressbook[zone]
 
         # sort by (parent_token, version, address),
         # then partition by parent_token
@@ -79,16 +80,14 @@ class Addressbook:
             ),
             key=lambda address: address.parent_token,
         ):
-            # merge sorted lists of IP objects
-            self.addressbook[zone][parent_token] = list(
-                heapq.merge(
-                    self.addressbook[zone][parent_token],
-                    address_list,
-                    key=ipaddress.get_mixed_type_key,
+            # merge sorted lists of IP objects and drop redundant addresses and
+            # networks in the same pass
+            zone_book[parent_token] = list(
+                _drop_subnets(
+                    heapq.merge(
+                        zone_book[parent_token],
+                        address_list,
+                        key=ipaddress.get_mixed_type_key,
+                    )
                 )
             )
-
-            # drop redundant addresses and networks
-            self.addressbook[zone][parent_token] = list(
-                _drop_subnets(self.addressbook[zone][parent_token])
-            )
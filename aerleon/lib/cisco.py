@@ -16,8 +16,10 @@
 
 """Cisco generator."""
 
+import functools
 import ipaddress
-from typing import Any, Dict, List, Optional, Set, Tuple, Union, cast
+import itertools
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from absl import logging
 
@@ -37,6 +39,12 @@ _ACTION_TABLE = {
 _COMMENT_MAX_WIDTH = 70
 
 
+@functools.lru_cache(maxsize=1024)
+def _WrapComments(comments: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Wraps comment lines to _COMMENT_MAX_WIDTH, caching repeated comment blocks."""
+    return tuple(aclgenerator.WrapWords(list(comments), _COMMENT_MAX_WIDTH))
+
+
 # generic error class
 class Error(aclgenerator.Error):
     """Generic error class."""
@@ -111,6 +119,10 @@ class TermStandard:
             self.dscpstring = ' dscp' + self.term.dscp_match
 
     def __str__(self) -> str:
+        return '\n'.join(self.RenderLines())
+
+    def RenderLines(self) -> List[str]:
+        """Render the term as a list of configuration lines."""
         ret_str = []
 
         # Term verbatim output - this will skip over normal term creation
@@ -119,7 +131,7 @@ class TermStandard:
             for next_verbatim in self.term.verbatim:
                 if next_verbatim[0] == self.platform:
                     ret_str.append(str(next_verbatim[1]))
-            return '\n'.join(ret_str)
+            return ret_str
 
         v4_addresses = [x for x in self.term.address if not isinstance(x, nacaddr.IPv6)]
         prefix = ''
@@ -128,34 +140,32 @@ class TermStandard:
 
         if self.verbose:
             ret_str.append(f'{prefix} remark {self.term.name}')
-            comments = aclgenerator.WrapWords(self.term.comment, _COMMENT_MAX_WIDTH)
+            comments = _WrapComments(tuple(self.term.comment))
             for comment in comments:
                 ret_str.append(f'{prefix} remark {comment}')
 
         action = _ACTION_TABLE.get(str(self.term.action[0]))
+        suffix = f'{self.logstring}{self.dscpstring}'
         if v4_addresses:
-            for addr in v4_addresses:
-                if self.platform == 'arista':
-                    if addr.prefixlen == 32:
-                        ret_str.append(
-                            f'{prefix} {action} host {addr.network_address}{self.logstring}{self.dscpstring}'
-                        )
-                    else:
-                        ret_str.append(
-                            f'{prefix} {action} {addr.network_address}/{addr.prefixlen}{self.logstring}{self.dscpstring}'
-                        )
-                elif addr.prefixlen == 32:
-                    ret_str.append(
-                        f'{prefix} {action} {addr.network_address}{self.logstring}{self.dscpstring}'
-                    )
-                else:
-                    ret_str.append(
-                        f'{prefix} {action} {addr.network_address} {addr.hostmask}{self.logstring}{self.dscpstring}'
-                    )
+            # pick the platform's address syntax once, then render every address.
+            if self.platform == 'arista':
+                ret_str.extend(
+                    f'{prefix} {action} host {addr.network_address}{suffix}'
+                    if addr.prefixlen == 32
+                    else f'{prefix} {action} {addr.network_address}/{addr.prefixlen}{suffix}'
+                    for addr in v4_addresses
+                )
+            else:
+                ret_str.extend(
+                    f'{prefix} {action} {addr.network_address}{suffix}'
+                    if addr.prefixlen == 32
+                    else f'{prefix} {action} {addr.network_address} {addr.hostmask}{suffix}'
+                    for addr in v4_addresses
+                )
         else:
-            ret_str.append(f'{prefix} {action} any{self.logstring}{self.dscpstring}')
+            ret_str.append(f'{prefix} {action} any{suffix}')
 
-        return '\n'.join(ret_str)
+        return ret_str
 
 
 class ObjectGroup:
@@ -195,10 +205,12 @@ class ObjectGroup:
         self.filter_name = filter_name
 
     def __str__(self) -> str:
+        return '\n'.join(self.RenderLines())
+
+    def RenderLines(self) -> List[str]:
+        """Render the object-group definitions as a list of configuration lines."""
         ret_str = ['\n']
-        # netgroups will contain two-tuples of group name string and family int.
-        netgroups = set()
-        ports = {}
+        ports = set()
 
         # I don't have an easy way get the token name used in the pol file
         # w/o reading the pol file twice (with some other library) or doing
@@ -209,30 +221,28 @@ class ObjectGroup:
 
         # Create network object-groups
         for name, ips in self.addressbook.addressbook[''].items():
-            for version in (4, 6):
-                vips = [i for i in ips if i.version == version]
+            # split the group by address family in a single pass.
+            ips_by_version = {4: [], 6: []}
+            for ip in ips:
+                ips_by_version[ip.version].append(ip)
+            for version, vips in ips_by_version.items():
                 if vips:
+                    body = '\n'.join(f' {ip.network_address}/{ip.prefixlen}' for ip in vips)
+                    ret_str.append(f'object-group network ipv{version} {name}\n{body}\nexit\n')
 
-                    ret_str.append(f'object-group network ipv{version} {name}')
-                    for ip in vips:
-                        ret_str.append(f' {ip.network_address}/{ip.prefixlen}')
-                    ret_str.append('exit\n')
-
-            # Create port object-groups
+        # Create port object-groups
         for term in self.terms:
-            for port in term.source_port + term.destination_port:
-                if not port:
+            for port in itertools.chain(term.source_port, term.destination_port):
+                if not port or port in ports:
                     continue
-                port_key = '%s-%s' % (port[0], port[1])
-                if port_key not in ports:
-                    ports[port_key] = True
-                    ret_str.append('object-group port %s' % port_key)
-                    if port[0] != port[1]:
-                        ret_str.append(' range %d %d' % (port[0], port[1]))
-                    else:
-                        ret_str.append(' eq %d' % port[0])
-                    ret_str.append('exit\n')
-        return '\n'.join(ret_str)
+                ports.add(port)
+                ret_str.append(f'object-group port {port[0]}-{port[1]}')
+                if port[0] != port[1]:
+                    ret_str.append(f' range {port[0]:d} {port[1]:d}')
+                else:
+                    ret_str.append(f' eq {port[0]:d}')
+                ret_str.append('exit\n')
+        return ret_str
 
 
 class PortMap:
@@ -396,24 +406,47 @@ class PortMap:
             return port_num
 
 
+@functools.lru_cache(maxsize=4096)
+def _FormatNetwork(addr: Union[IPv4, IPv6], arista: bool = False) -> str:
+    """Formats a non-default network for an extended ACL line.
+
+    Networks hash by address and netmask, so the same network referenced from
+    many terms is only formatted once.
+
+    Args:
+      addr: IPv4 or IPv6 network with a non-zero prefix length.
+      arista: True to write IPv4 networks in prefix notation.
+
+    Returns:
+      An address string suitable for the ACL.
+    """
+    if addr.prefixlen == addr.max_prefixlen:
+        return f'host {addr.network_address}'
+    if addr.version == 6 or arista:
+        return addr.with_prefixlen
+    return f'{addr.network_address} {addr.hostmask}'
+
+
 class Term(aclgenerator.Term):
     """This is an general Term object that all other Cisco Terms should inherite from."""
 
-    ALLOWED_PROTO_STRINGS = [
-        'eigrp',
-        'gre',
-        'icmp',
-        'igmp',
-        'igrp',
-        'ip',
-        'ipinip',
-        'nos',
-        'pim',
-        'tcp',
-        'udp',
-        'sctp',
-        'ahp',
-    ]
+    ALLOWED_PROTO_STRINGS = frozenset(
+        [
+            'eigrp',
+            'gre',
+            'icmp',
+            'igmp',
+            'igrp',
+            'ip',
+            'ipinip',
+            'nos',
+            'pim',
+            'tcp',
+            'udp',
+            'sctp',
+            'ahp',
+        ]
+    )
     IPV4_ADDRESS = Union[nacaddr.IPv4, ipaddress.IPv4Network]
     IPV6_ADDRESS = Union[nacaddr.IPv6, ipaddress.IPv6Network]
 
@@ -441,8 +474,19 @@ class Term(aclgenerator.Term):
             self.text_af = 'inet'
         else:
             self.text_af = 'inet6'
+        # _RenderLines() result; rendering appends to self.options, so it runs once.
+        self._lines = None
 
     def __str__(self) -> str:
+        return '\n'.join(self.RenderLines())
+
+    def RenderLines(self) -> List[str]:
+        """Render the term as a list of configuration lines."""
+        if self._lines is None:
+            self._lines = self._RenderLines()
+        return self._lines
+
+    def _RenderLines(self) -> List[str]:
         ret_str = ['\n']
 
         # Don't render icmpv6 protocol terms under inet, or icmp under inet6
@@ -457,7 +501,7 @@ class Term(aclgenerator.Term):
                     term=self.term.name, proto=', '.join(self.term.protocol), af=self.text_af
                 )
             )
-            return ''
+            return []
 
         # verbose
         if self.verbose:
@@ -468,10 +512,10 @@ class Term(aclgenerator.Term):
                 comments.append(f'Owner: {self.term.owner}')
             comments.extend(self.term.comment)
 
-            comments = aclgenerator.WrapWords(comments, _COMMENT_MAX_WIDTH)
+            comments = _WrapComments(tuple(comments))
             if comments and comments[0]:
                 for comment in comments:
-                    ret_str.append(' remark %s' % str(comment))
+                    ret_str.append(f' remark {comment}')
 
         # Term verbatim output - this will skip over normal term creation
         # code by returning early.  Warnings provided in policy.py.
@@ -479,7 +523,7 @@ class Term(aclgenerator.Term):
             for next_verbatim in self.term.verbatim:
                 if next_verbatim[0] == self.platform:
                     ret_str.append(str(next_verbatim[1]))
-            return '\n'.join(ret_str)
+            return ret_str
 
         # protocol
         if not self.term.protocol:
@@ -492,11 +536,11 @@ class Term(aclgenerator.Term):
         elif self.term.protocol == ['hopopt'] or self.term.protocol == self.PROTO_MAP['hopopt']:
             protocol = ['hbh']
         elif self.proto_int:
-
+            # names without a known number are passed through unchanged.
             protocol = [
                 proto
                 if proto in self.ALLOWED_PROTO_STRINGS or proto.isnumeric()
-                else self.PROTO_MAP.get(proto)
+                else self.PROTO_MAP.get(proto, proto)
                 for proto in self.term.protocol
             ]
         else:
@@ -511,21 +555,14 @@ class Term(aclgenerator.Term):
         # addresses
         # source address
         if self.term.source_address:
-            source_address = self.term.GetAddressOfVersion('source_address', self.af)
-            source_address_exclude = self.term.GetAddressOfVersion(
-                'source_address_exclude', self.af
-            )
-            if source_address_exclude:
-                source_address = nacaddr.ExcludeAddrs(source_address, source_address_exclude)
+            source_address = self._GetAddresses('source_address')
             if not source_address:
                 logging.warning(
                     self.NO_AF_LOG_ADDR.substitute(
                         term=self.term.name, direction='source', af=self.text_af
                     )
                 )
-                return ''
-            if self.enable_dsmo:
-                source_address = summarizer.Summarize(source_address)
+                return []
         else:
             # source address not set
             source_address = [nacaddr.IPv4('0.0.0.0/0', token='any')]
@@ -533,23 +570,14 @@ class Term(aclgenerator.Term):
 
         # destination address
         if self.term.destination_address:
-            destination_address = self.term.GetAddressOfVersion('destination_address', self.af)
-            destination_address_exclude = self.term.GetAddressOfVersion(
-                'destination_address_exclude', self.af
-            )
-            if destination_address_exclude:
-                destination_address = nacaddr.ExcludeAddrs(
-                    destination_address, destination_address_exclude
-                )
+            destination_address = self._GetAddresses('destination_address')
             if not destination_address:
                 logging.warning(
                     self.NO_AF_LOG_ADDR.substitute(
                         term=self.term.name, direction='destination', af=self.text_af
                     )
                 )
-                return ''
-            if self.enable_dsmo:
-                destination_address = summarizer.Summarize(destination_address)
+                return []
         else:
             # destination address not set
             destination_address = [nacaddr.IPv4('0.0.0.0/0', token='any')]
@@ -570,8 +598,8 @@ class Term(aclgenerator.Term):
 
         # options
         opts = [str(x) for x in self.term.option]
-        if (self.PROTO_MAP['tcp'] in protocol or 'tcp' in protocol) and (
-            'tcp-established' in opts or 'established' in opts
+        if ('tcp-established' in opts or 'established' in opts) and (
+            'tcp' in protocol or self.PROTO_MAP['tcp'] in protocol
         ):
             if 'established' not in self.options:
                 self.options.append('established')
@@ -630,38 +658,62 @@ class Term(aclgenerator.Term):
         if self.term.icmp_code:
             icmp_codes = self.term.icmp_code
 
+        # options only vary by protocol, so join them once per protocol.
         fixed_opts = {}
         for p in protocol:
-            fixed_opts[p] = self._FixOptions(p, self.options)
+            fixed_opts[p] = ' '.join(self._FixOptions(p, self.options))
+        # str(icmp_type) is needed to ensure 0 maps to '0' instead of FALSE
+        icmp_types = [str(icmp_type) for icmp_type in sorted(icmp_types)]
+        icmp_codes = [str(icmp_code) for icmp_code in sorted(icmp_codes)]
+
+        # cisconx uses icmp for both ipv4 and ipv6
+        rename_icmpv6 = self.platform == 'cisconx' and self.af == 6
 
         # temlet constructor
-        for saddr in sorted(fixed_src_addresses):
-            for daddr in sorted(fixed_dst_addresses):
-                for sport in sorted(source_port):
-                    for dport in sorted(destination_port):
-                        for proto in sorted(protocol):
-                            opts = fixed_opts[proto]
-                            # cisconx uses icmp for both ipv4 and ipv6
-                            if self.platform == 'cisconx':
-                                if self.af == 6:
-                                    proto = 'icmp' if proto == 'icmpv6' else proto
-                            for icmp_type in sorted(icmp_types):
-                                for icmp_code in sorted(icmp_codes):
-                                    ret_str.extend(
-                                        self._TermletToStr(
-                                            action,
-                                            proto,
-                                            saddr,
-                                            self._FormatPort(sport, proto),
-                                            daddr,
-                                            self._FormatPort(dport, proto),
-                                            icmp_type,
-                                            icmp_code,
-                                            opts,
-                                        )
-                                    )
-
-        return '\n'.join(ret_str)
+        for saddr, daddr, sport, dport, proto, icmp_type, icmp_code in itertools.product(
+            sorted(fixed_src_addresses),
+            sorted(fixed_dst_addresses),
+            sorted(source_port),
+            sorted(destination_port),
+            sorted(protocol),
+            icmp_types,
+            icmp_codes,
+        ):
+            opts = fixed_opts[proto]
+            if rename_icmpv6 and proto == 'icmpv6':
+                proto = 'icmp'
+            ret_str.append(
+                self._TermletToStr(
+                    action,
+                    proto,
+                    saddr,
+                    self._FormatPort(sport, proto),
+                    daddr,
+                    self._FormatPort(dport, proto),
+                    icmp_type,
+                    icmp_code,
+                    opts,
+                )
+            )
+
+        return ret_str
+
+    def _GetAddresses(self, attribute: str) -> List[Union[IPv4, IPv6, DSMNet]]:
+        """Returns the term's addresses of this address family, less exclusions.
+
+        Args:
+          attribute: 'source_address' or 'destination_address'.
+
+        Returns:
+          A list of addresses, summarized when DSMO is enabled.
+        """
+        addresses = self.term.GetAddressOfVersion(attribute, self.af)
+        addresses_exclude = self.term.GetAddressOfVersion(f'{attribute}_exclude', self.af)
+        if addresses_exclude:
+            addresses = nacaddr.ExcludeAddrs(addresses, addresses_exclude)
+        if addresses and self.enable_dsmo:
+            addresses = summarizer.Summarize(addresses)
+        return addresses
 
     def _GetIpString(self, addr: Union[IPv6, IPv4, DSMNet]) -> str:
         """Formats the address object for printing in the ACL.
@@ -676,18 +728,11 @@ class Term(aclgenerator.Term):
             return '%s %s' % summarizer.ToDottedQuad(addr, negate=True)
         if addr.prefixlen == 0:
             return 'any'
-        if isinstance(addr, nacaddr.IPv4) or isinstance(addr, ipaddress.IPv4Network):
-            addr = cast(self.IPV4_ADDRESS, addr)
-            if addr.num_addresses > 1:
-                if self.platform == 'arista':
-                    return addr.with_prefixlen
-                return '%s %s' % (addr.network_address, addr.hostmask)
-            return 'host %s' % (addr.network_address)
-        if isinstance(addr, nacaddr.IPv6) or isinstance(addr, ipaddress.IPv6Network):
-            addr = cast(self.IPV6_ADDRESS, addr)
-            if addr.num_addresses > 1:
-                return addr.with_prefixlen
-            return 'host %s' % (addr.network_address)
+        # nacaddr.IPv4/IPv6 subclass the ipaddress networks, so the version
+        # attribute tells both families apart with a single comparison.
+        # Anything that is neither falls through and is returned unchanged.
+        if addr.version == 4 or addr.version == 6:
+            return _FormatNetwork(addr, self.platform == 'arista')
         return addr
 
     def _FormatPort(self, port: Union[Tuple[()], Tuple[int, int]], proto: Union[int, str]) -> str:
@@ -709,8 +754,8 @@ class Term(aclgenerator.Term):
             port1 = PortMap.GetProtocol(port1, proto, self.platform)
 
         if port[0] != port[1]:
-            return 'range %s %s' % (port0, port1)
-        return 'eq %s' % (port0)
+            return f'range {port0} {port1}'
+        return f'eq {port0}'
 
     def _FixOptions(
         self, proto: Union[int, str], option: List[Union[str, Any]]
@@ -729,7 +774,7 @@ class Term(aclgenerator.Term):
         """
         # Prevent UDP from appending 'established' to ACL line
         sane_options = list(option)
-        if (proto == self.PROTO_MAP['udp'] or proto == 'udp') and 'established' in sane_options:
+        if 'established' in sane_options and proto in ('udp', self.PROTO_MAP['udp']):
             sane_options.remove('established')
         return sane_options
 
@@ -741,10 +786,10 @@ class Term(aclgenerator.Term):
         sport: str,
         daddr: str,
         dport: str,
-        icmp_type: Union[int, str],
-        icmp_code: Union[int, str],
-        option: List[str],
-    ) -> List[str]:
+        icmp_type: str,
+        icmp_code: str,
+        option: str,
+    ) -> str:
         """Take the various compenents and turn them into a cisco acl line.
 
         Args:
@@ -754,9 +799,9 @@ class Term(aclgenerator.Term):
           sport: str, the source port
           daddr: str, the destination address
           dport: str, the destination port
-          icmp_type: icmp-type numeric specification (if any)
-          icmp_code: icmp-code numeric specification (if any)
-          option: list of options, eg. 'logging' tokens.
+          icmp_type: str, icmp-type numeric specification (if any)
+          icmp_code: str, icmp-code numeric specification (if any)
+          option: str, space separated options, eg. 'logging' tokens.
 
         Returns:
           string of the cisco acl line, suitable for printing.
@@ -764,10 +809,7 @@ class Term(aclgenerator.Term):
         Raises:
           UnsupportedCiscoAccessListError: When unknown icmp-types specified
         """
-        # str(icmp_type) is needed to ensure 0 maps to '0' instead of FALSE
-        icmp_type = str(icmp_type)
-        icmp_code = str(icmp_code)
-        all_elements = [
+        all_elements = (
             action,
             str(proto),
             saddr,
@@ -776,10 +818,9 @@ class Term(aclgenerator.Term):
             dport,
             icmp_type,
             icmp_code,
-            ' '.join(option),
-        ]
-        non_empty_elements = [x for x in all_elements if x]
-        return [' ' + ' '.join(non_empty_elements)]
+            option,
+        )
+        return ' ' + ' '.join([x for x in all_elements if x])
 
     def _FixConsecutivePorts(self, port_list: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
         """Takes a list of tuples and expands the tuple if the range is two.
@@ -793,12 +834,13 @@ class Term(aclgenerator.Term):
           list of tuples
         """
         temporary_port_list = []
-        for low_port, high_port in port_list:
+        append = temporary_port_list.append
+        for port_range in port_list:
+            low_port, high_port = port_range
             if low_port == high_port - 1:
-                temporary_port_list.append((low_port, low_port))
-                temporary_port_list.append((high_port, high_port))
+                temporary_port_list.extend(((low_port, low_port), (high_port, high_port)))
             else:
-                temporary_port_list.append((low_port, high_port))
+                append(port_range)
         return temporary_port_list
 
 
@@ -857,6 +899,13 @@ class Cisco(aclgenerator.ACLGenerator):
     # Protocols should be emitted as numbers.
     _PROTO_INT = True
     _TERM_REMARK = True
+    # Header line templates for each filter type, filled in with the filter name.
+    _FILTER_TYPE_HEADERS = {
+        'standard': ('no ip access-list standard %s', 'ip access-list standard %s'),
+        'extended': ('no ip access-list extended %s', 'ip access-list extended %s'),
+        'object-group': ('no ip access-list extended %s', 'ip access-list extended %s'),
+        'inet6': ('no ipv6 access-list %s', 'ipv6 access-list %s'),
+    }
 
     def _BuildTokens(self) -> Tuple[Set[str], Dict[str, Set[str]]]:
         """Build supported tokens for platform.
@@ -893,8 +942,9 @@ class Cisco(aclgenerator.ACLGenerator):
         for header, terms in pol.filters:
             obj_target = ObjectGroup()
 
+            # the filter name is the first target option, so read both at once.
             filter_options = header.FilterOptions(self._PLATFORM)
-            filter_name = header.FilterName(self._PLATFORM)
+            filter_name = filter_options[0]
 
             self.verbose = True
             if 'noverbose' in filter_options:
@@ -918,22 +968,29 @@ class Cisco(aclgenerator.ACLGenerator):
                 # Loop through filter and generate output for inet and inet6 in sequence
                 filter_list = ['extended', 'inet6']
 
+            # Numeric access lists can be extended or standard, but have specific
+            # known ranges.
+            standard_range = False
+            if filter_name.isdigit():
+                filter_number = int(filter_name)
+                standard_range = 1 <= filter_number < 100 or 1300 <= filter_number < 2000
+
             for next_filter in filter_list:
-                # Numeric access lists can be extended or standard, but have specific
-                # known ranges.
                 if next_filter == 'extended' and filter_name.isdigit():
-                    if int(filter_name) in list(range(1, 100)) + list(range(1300, 2000)):
+                    if standard_range:
                         raise UnsupportedCiscoAccessListError(
                             'Access lists between 1-99 and 1300-1999 are reserved for '
                             'standard ACLs'
                         )
                 if next_filter == 'standard' and filter_name.isdigit():
-                    if int(filter_name) not in list(range(1, 100)) + list(range(1300, 2000)):
+                    if not standard_range:
                         raise UnsupportedCiscoAccessListError(
                             'Standard access lists must be numeric in the range of 1-99'
                             ' or 1300-1999.'
                         )
 
+                af = 'inet6' if next_filter == 'inet6' else 'inet'
+                enable_dsmo = len(filter_options) > 2 and filter_options[2] == 'enable_dsmo'
                 term_dup_check = set()
                 new_terms = []
                 for term in terms:
@@ -942,9 +999,6 @@ class Cisco(aclgenerator.ACLGenerator):
                     term_dup_check.add(term.name)
 
                     term.name = self.FixTermLength(term.name)
-                    af = 'inet'
-                    if next_filter == 'inet6':
-                        af = 'inet6'
                     term = self.FixHighPorts(term, af=af)
                     if not term:
                         continue
@@ -960,9 +1014,6 @@ class Cisco(aclgenerator.ACLGenerator):
                             TermStandard(term, filter_name, self._PLATFORM, self.verbose)
                         )
                     elif next_filter == 'extended':
-                        enable_dsmo = (
-                            len(filter_options) > 2 and filter_options[2] == 'enable_dsmo'
-                        )
                         new_terms.append(
                             ExtendedTerm(
                                 term,
@@ -1011,27 +1062,15 @@ class Cisco(aclgenerator.ACLGenerator):
         Raises:
           UnsupportedCiscoAccessListError: When unknown filter type is used.
         """
-        target = []
-        if filter_type == 'standard':
-            if filter_name.isdigit():
-                target.append('no access-list %s' % filter_name)
-            else:
-                target.append('no ip access-list standard %s' % filter_name)
-                target.append('ip access-list standard %s' % filter_name)
-        elif filter_type == 'extended':
-            target.append('no ip access-list extended %s' % filter_name)
-            target.append('ip access-list extended %s' % filter_name)
-        elif filter_type == 'object-group':
-            target.append('no ip access-list extended %s' % filter_name)
-            target.append('ip access-list extended %s' % filter_name)
-        elif filter_type == 'inet6':
-            target.append('no ipv6 access-list %s' % filter_name)
-            target.append('ipv6 access-list %s' % filter_name)
-        else:
+        if filter_type == 'standard' and filter_name.isdigit():
+            return ['no access-list %s' % filter_name]
+        try:
+            templates = self._FILTER_TYPE_HEADERS[filter_type]
+        except KeyError:
             raise UnsupportedCiscoAccessListError(
                 'access list type %s not supported by %s' % (filter_type, self._PLATFORM)
             )
-        return target
+        return [template % filter_name for template in templates]
 
     def _RepositoryTagsHelper(
         self, target: Optional[List[str]] = None, filter_type: str = '', filter_name: str = ''
@@ -1049,7 +1088,9 @@ class Cisco(aclgenerator.ACLGenerator):
         return target
 
     def __str__(self) -> str:
-        target_header = []
+        # object-group definitions go before everything else, with each filter's
+        # groups ahead of those of the filters before it.
+        object_groups = []
         target = []
         # add the p4 tags
         target.extend(aclgenerator.AddRepositoryTags('! '))
@@ -1067,27 +1108,24 @@ class Cisco(aclgenerator.ACLGenerator):
                     target = self._RepositoryTagsHelper(target, filter_type, filter_name)
 
                     # add a header comment if one exists
-
-                    for comment in aclgenerator.WrapWords(header.comment, _COMMENT_MAX_WIDTH):
-                        for line in comment.split('\n'):
-                            if (
-                                self._PLATFORM == 'cisco'
-                                and filter_type == 'standard'
-                                and filter_name.isdigit()
-                            ):
-                                target.append('access-list %s remark %s' % (filter_name, line))
-                            else:
-                                target.append(' remark %s' % line)
+                    if (
+                        self._PLATFORM == 'cisco'
+                        and filter_type == 'standard'
+                        and filter_name.isdigit()
+                    ):
+                        remark_prefix = f'access-list {filter_name} remark '
+                    else:
+                        remark_prefix = ' remark '
+                    # wrapped comments are already split into single lines.
+                    target.extend(
+                        remark_prefix + comment for comment in _WrapComments(tuple(header.comment))
+                    )
 
                 # now add the terms
                 for term in terms:
-                    term_str = str(term)
-                    if term_str:
-                        target.append(term_str)
+                    target.extend(term.RenderLines())
 
             if obj_target.addressbook.addressbook.keys():
-                target = [str(obj_target)] + target
-            # ensure that the header is always first
-            target = target_header + target
+                object_groups.append(obj_target.RenderLines())
             target += ['', 'exit', '']
-        return '\n'.join(target)
+        return '\n'.join(itertools.chain(*reversed(object_groups), target))
@@ -16,15 +16,15 @@
 
 """Cisco ASA renderer."""
 
-import ipaddress
-import re
-from typing import Any, Dict, List, Set, Tuple, Union, cast
+import itertools
+from typing import Dict, List, Set, Tuple, Union
 
 from absl import logging
 
 from aerleon.lib import aclgenerator, cisco, nacaddr, summarizer
 from aerleon.lib.nacaddr import IPv4, IPv6
 from aerleon.lib.policy import Policy, Term
+from aerleon.lib.summarizer import DSMNet
 
 _ACTION_TABLE = {
     'accept': 'permit',
@@ -157,45 +157,49 @@ class Term(cisco.ExtendedTerm):
         if self.term.icmp_type:
             icmp_types = self.NormalizeIcmpTypes(self.term.icmp_type, self.term.protocol, self.af)
 
-        for saddr in source_address:
-            for daddr in destination_address:
-                for sport in source_port:
-                    for dport in destination_port:
-                        for proto in protocol:
-                            for icmp_type in icmp_types:
-                                # only output address family appropriate IP addresses
-                                do_output = False
-                                if self.af == 4:
-                                    if (
-                                        (isinstance(saddr, nacaddr.IPv4)) or (saddr == 'any')
-                                    ) and ((isinstance(daddr, nacaddr.IPv4)) or (daddr == 'any')):
-                                        do_output = True
-                                    elif isinstance(saddr, summarizer.DSMNet) or isinstance(
-                                        daddr, summarizer.DSMNet
-                                    ):
-                                        do_output = True
-                                if self.af == 6:
-                                    if (
-                                        (isinstance(saddr, nacaddr.IPv6)) or (saddr == 'any')
-                                    ) and ((isinstance(daddr, nacaddr.IPv6)) or (daddr == 'any')):
-                                        do_output = True
-                                if do_output:
-                                    ret_str.extend(
-                                        self._TermletToStr(
-                                            self.filter_name,
-                                            _ACTION_TABLE.get(str(self.term.action[0])),
-                                            proto,
-                                            saddr,
-                                            sport,
-                                            daddr,
-                                            dport,
-                                            icmp_type,
-                                            self.options,
-                                        )
-                                    )
+        action = _ACTION_TABLE.get(str(self.term.action[0]))
+        # the address family check only depends on the address pair, so filter
+        # the pairs once rather than for every port/protocol combination.
+        address_pairs = [
+            (saddr, daddr)
+            for saddr, daddr in itertools.product(source_address, destination_address)
+            if self._MatchesAddressFamily(saddr, daddr)
+        ]
+        for (saddr, daddr), sport, dport, proto, icmp_type in itertools.product(
+            address_pairs, source_port, destination_port, protocol, icmp_types
+        ):
+            ret_str.extend(
+                self._TermletToStr(
+                    self.filter_name,
+                    action,
+                    proto,
+                    saddr,
+                    sport,
+                    daddr,
+                    dport,
+                    icmp_type,
+                    self.options,
+                )
+            )
 
         return '\n'.join(ret_str)
 
+    def _MatchesAddressFamily(
+        self, saddr: Union[str, IPv4, IPv6, DSMNet], daddr: Union[str, IPv4, IPv6, DSMNet]
+    ) -> bool:
+        """Returns True if an address pair should be rendered for this term's family."""
+        if self.af == 4:
+            if (isinstance(saddr, nacaddr.IPv4) or saddr == 'any') and (
+                isinstance(daddr, nacaddr.IPv4) or daddr == 'any'
+            ):
+                return True
+            return isinstance(saddr, summarizer.DSMNet) or isinstance(daddr, summarizer.DSMNet)
+        if self.af == 6:
+            return (isinstance(saddr, nacaddr.IPv6) or saddr == 'any') and (
+                isinstance(daddr, nacaddr.IPv6) or daddr == 'any'
+            )
+        return False
+
     def _TermletToStr(
         self,
         filter_name: str,
@@ -224,90 +228,70 @@ class Term(cisco.ExtendedTerm):
         Returns:
           string of the cisco acl line, suitable for printing.
         """
-        # inet4
-        if isinstance(saddr, nacaddr.IPv4) or isinstance(saddr, ipaddress.IPv4Network):
-            saddr = cast(self.IPV4_ADDRESS, saddr)
-            if saddr.num_addresses > 1:
-                saddr = '%s %s' % (saddr.network_address, saddr.netmask)
-            else:
-                saddr = 'host %s' % (saddr.network_address)
-        elif isinstance(daddr, nacaddr.IPv4) or isinstance(daddr, ipaddress.IPv4Network):
-            daddr = cast(self.IPV4_ADDRESS, daddr)
-            if daddr.num_addresses > 1:
-                daddr = '%s %s' % (daddr.network_address, daddr.netmask)
-            else:
-                daddr = 'host %s' % (daddr.network_address)
-        elif isinstance(saddr, summarizer.DSMNet):
-            saddr = '%s %s' % summarizer.ToDottedQuad(saddr, negate=False)
-
-        if isinstance(daddr, summarizer.DSMNet):
-            daddr = '%s %s' % summarizer.ToDottedQuad(daddr, negate=False)
-        # inet6
-        elif isinstance(saddr, nacaddr.IPv6) or isinstance(saddr, ipaddress.IPv6Network):
-            saddr = cast(self.IPV6_ADDRESS, saddr)
-            if saddr.num_addresses > 1:
-                saddr = '%s/%s' % (saddr.network_address, saddr.prefixlen)
-            else:
-                saddr = 'host %s' % (saddr.network_address)
-        elif isinstance(daddr, nacaddr.IPv6) or isinstance(daddr, ipaddress.IPv6Network):
-            daddr = cast(self.IPV6_ADDRESS, daddr)
-            if daddr.num_addresses > 1:
-                daddr = '%s/%s' % (daddr.network_address, daddr.prefixlen)
-            else:
-                daddr = 'host %s' % (daddr.network_address)
+        saddr = self._AddressToStr(saddr)
+        daddr = self._AddressToStr(daddr)
 
         # fix ports
         if not sport:
             sport = ''
         elif sport[0] != sport[1]:
-            sport = ' range %s %s' % (
+            sport = 'range %s %s' % (
                 cisco.PortMap.GetProtocol(sport[0], proto),
                 cisco.PortMap.GetProtocol(sport[1], proto),
             )
         else:
-            sport = ' eq %s' % (cisco.PortMap.GetProtocol(sport[0], proto))
+            sport = 'eq %s' % (cisco.PortMap.GetProtocol(sport[0], proto))
 
         if not dport:
             dport = ''
         elif dport[0] != dport[1]:
-            dport = ' range %s %s' % (
+            dport = 'range %s %s' % (
                 cisco.PortMap.GetProtocol(dport[0], proto),
                 cisco.PortMap.GetProtocol(dport[1], proto),
             )
         else:
-            dport = ' eq %s' % (cisco.PortMap.GetProtocol(dport[0], proto))
-
-        if not option:
-            option = ['']
+            dport = 'eq %s' % (cisco.PortMap.GetProtocol(dport[0], proto))
 
         # Prevent UDP from appending 'established' to ACL line
         sane_options = list(option)
         if proto == 'udp' and 'established' in sane_options:
             sane_options.remove('established')
 
-        ret_lines = []
-
         # str(icmp_type) is needed to ensure 0 maps to '0' instead of FALSE
         icmp_type = str(cisco.PortMap.GetProtocol(icmp_type, 'icmp'))
 
-        ret_lines.append(
-            'access-list %s extended  %s %s %s %s %s %s %s %s'
-            % (
-                filter_name,
-                action,
-                proto,
-                saddr,
-                sport,
-                daddr,
-                dport,
-                icmp_type,
-                ' '.join(sane_options),
-            )
+        # only join the fields that are set, so no whitespace cleanup is needed.
+        all_elements = (
+            'access-list %s extended' % filter_name,
+            action,
+            str(proto),
+            saddr,
+            sport,
+            daddr,
+            dport,
+            icmp_type,
+            ' '.join(sane_options),
         )
+        return [' '.join([x for x in all_elements if x])]
+
+    def _AddressToStr(self, addr: Union[str, IPv4, IPv6, DSMNet]) -> str:
+        """Formats a single source or destination address for an ACL line.
+
+        Args:
+          addr: 'any', a DSMO summarised network, or an ipaddress network.
 
-        # remove any trailing spaces and replace multiple spaces with singles
-        stripped_ret_lines = [re.sub(r'\s+', ' ', x).rstrip() for x in ret_lines]
-        return stripped_ret_lines
+        Returns:
+          An address string suitable for the ACL.
+        """
+        if isinstance(addr, summarizer.DSMNet):
+            return '%s %s' % summarizer.ToDottedQuad(addr, negate=False)
+        if isinstance(addr, str):
+            return addr
+        if addr.prefixlen == addr.max_prefixlen:
+            return 'host %s' % addr.network_address
+        if addr.version == 4:
+            return '%s %s' % (addr.network_address, addr.netmask)
+        return '%s/%s' % (addr.network_address, addr.prefixlen)
 
 
 class CiscoASA(aclgenerator.ACLGenerator):
@@ -5,11 +5,21 @@
 Base class for GCP firewalling products.
 """
 
+import functools
+import io
+import itertools
 import json
-import re
+import string
 
 from aerleon.lib import aclgenerator
 
+# Character classes for GCP resource names: [a-z][a-z0-9-]*[a-z0-9].
+_NAME_FIRST_CHARS = frozenset(string.ascii_lowercase)
+_NAME_LAST_CHARS = _NAME_FIRST_CHARS | frozenset(string.digits)
+_NAME_CHARS = _NAME_LAST_CHARS | frozenset('-')
+
+_LOGGING_TRUE_VALUES = frozenset(['true', 'True'])
+
 
 class Error(aclgenerator.Error):
     """Generic error class."""
@@ -37,40 +47,70 @@ class Term(aclgenerator.Term):
 
     def _GetPorts(self):
         """Return a port or port range in string format."""
-        ports = []
-        for start, end in self.term.destination_port:
-            if start == end:
-                ports.append(str(start))
-            else:
-                ports.append('%d-%d' % (start, end))
-        return ports
+        return [
+            str(start) if start == end else f'{start}-{end}'
+            for start, end in self.term.destination_port
+        ]
+
+    def _TruncateComment(self, prefix, max_length):
+        """Return prefix followed by the term comments, truncated to max_length.
+
+        Comments are only joined until max_length is exceeded, so a long comment
+        list is never joined in full just to be cut.
+
+        Args:
+          prefix: A string to prepend to the joined comments.
+          max_length: max length of the returned string.
+
+        Returns:
+          string: The truncated description.
+        """
+        comments = []
+        length = len(prefix)
+        for comment in self.term.comment:
+            if length > max_length:
+                break
+            comments.append(comment)
+            length += len(comment) + 1
+        return TruncateString(prefix + ' '.join(comments), max_length)
 
     def _GetLoggingSetting(self):
         """Return true if a term indicates that logging is desired."""
         # Supported values in GCP are '', 'true', and 'True'.
-        settings = [str(x) for x in self.term.logging]
-        if any(value in settings for value in ['true', 'True']):
-            return True
-        return False
+        return any(str(x) in _LOGGING_TRUE_VALUES for x in self.term.logging)
 
 
 class GCP(aclgenerator.ACLGenerator):
     """A GCP object."""
 
-    policies = []
-    _GOOD_DIRECTION = ['INGRESS', 'EGRESS']
+    _GOOD_DIRECTION = frozenset(['INGRESS', 'EGRESS'])
+
+    def __init__(self, pol, exp_info):
+        self.policies = []
+        super().__init__(pol, exp_info)
 
     def __str__(self):
         """Return the JSON blob for a GCP object."""
-        out = '%s\n\n' % (
-            json.dumps(self.policies, indent=2, separators=(',', ': '), sort_keys=True)
-        )
-        return out
+        return _DumpJson(self.policies) + '\n\n'
 
 
-def IsDefaultDeny(term):
-    """Return true if a term is a default deny without IPs, ports, etc."""
-    skip_attrs = [
+def _DumpJson(obj):
+    """Return obj as indented JSON with sorted keys.
+
+    Args:
+      obj: A JSON serializable object.
+
+    Returns:
+      string: The JSON representation of obj.
+    """
+    out = io.StringIO()
+    json.dump(obj, out, indent=2, separators=(',', ': '), sort_keys=True)
+    return out.getvalue()
+
+
+# Term attributes that do not disqualify a term from being a default deny.
+_DEFAULT_DENY_SKIP_ATTRS = frozenset(
+    [
         'flattened',
         'flattened_addr',
         'flattened_saddr',
@@ -80,27 +120,69 @@ def IsDefaultDeny(term):
         'name',
         'logging',
     ]
+)
+
+# Maps a term class to the class-level data attributes IsDefaultDeny inspects.
+_TERM_DATA_ATTRS_CACHE = {}
+
+
+def _IsTermDataAttr(name, value):
+    """Return true if a term attribute is data that IsDefaultDeny inspects."""
+    return (
+        not name.startswith('__')
+        and name.islower()
+        and name not in _DEFAULT_DENY_SKIP_ATTRS
+        and not callable(value)
+    )
+
+
+def _GetTermDataAttrs(term):
+    """Return the data attributes of a term that IsDefaultDeny inspects.
+
+    Class-level attribute names are scanned once per class and cached. Instance
+    attributes can differ between terms of the same class, so they are read
+    from the term on every call.
+
+    Args:
+      term: A policy.Term object.
+
+    Returns:
+      iterator: Names of the non-callable, lowercase attributes of the term.
+    """
+    cls = type(term)
+    class_attrs = _TERM_DATA_ATTRS_CACHE.get(cls)
+    if class_attrs is None:
+        class_attrs = frozenset(a for a in dir(cls) if _IsTermDataAttr(a, getattr(cls, a, None)))
+        _TERM_DATA_ATTRS_CACHE[cls] = class_attrs
+    return itertools.chain(
+        class_attrs,
+        (a for a, v in vars(term).items() if a not in class_attrs and _IsTermDataAttr(a, v)),
+    )
+
+
+def IsDefaultDeny(term):
+    """Return true if a term is a default deny without IPs, ports, etc."""
     if 'deny' not in term.action:
         return False
-    # This lc will look through all methods and attributes of the object.
-    # It returns only the attributes that need to be looked at to determine if
-    # this is a default deny.
-    for i in [
-        a
-        for a in dir(term)
-        if not a.startswith('__') and a.islower() and not callable(getattr(term, a))
-    ]:
-        if i in skip_attrs:
-            continue
-        v = getattr(term, i)
-        if isinstance(v, str) and v:
-            return False
-        if isinstance(v, list) and v:
+    for i in _GetTermDataAttrs(term):
+        v = getattr(term, i, None)
+        # Most attributes are empty, so test truthiness before the type.
+        if v and isinstance(v, (str, list)):
             return False
 
     return True
 
 
+def _IsResourceNameValid(name):
+    """Return true if a non-empty name matches [a-z][a-z0-9-]*[a-z0-9]."""
+    return (
+        name[0] in _NAME_FIRST_CHARS
+        and name[-1] in _NAME_LAST_CHARS
+        and _NAME_CHARS.issuperset(name[1:-1])
+    )
+
+
+@functools.lru_cache(maxsize=1024)
 def IsProjectIDValid(project):
     """Return true if a project ID is valid.
 
@@ -115,11 +197,10 @@ def IsProjectIDValid(project):
     Returns:
       bool: True if a project ID matches the pattern and length requirements.
     """
-    if len(project) < 6 or len(project) > 30:
-        return False
-    return bool(re.match('^[a-z][a-z0-9\\-]*[a-z0-9]$', project))
+    return 6 <= len(project) <= 30 and _IsResourceNameValid(project)
 
 
+@functools.lru_cache(maxsize=1024)
 def IsVPCNameValid(vpc):
     """Return true if a VPC name is valid.
 
@@ -135,9 +216,7 @@ def IsVPCNameValid(vpc):
     Returns:
       bool: True if a VPC name matches the pattern and length requirements.
     """
-    if len(vpc) < 1 or len(vpc) > 63:
-        return False
-    return bool(re.match('^[a-z]$|^[a-z][a-z0-9-]*[a-z0-9]$', vpc))
+    return 1 <= len(vpc) <= 63 and _IsResourceNameValid(vpc)
 
 
 def TruncateString(raw_string, max_length):
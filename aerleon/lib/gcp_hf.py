@@ -179,9 +179,8 @@ class Term(gcp.Term):
         term_name = self.term.name
         if mixed_policy_inet6_term:
             term_name = gcp.GetIpv6TermName(term_name)
-        raw_description = term_name + ': ' + ' '.join(self.term.comment)
-        term_dict['description'] = gcp.TruncateString(
-            raw_description, self._MAX_TERM_COMMENT_LENGTH
+        term_dict['description'] = self._TruncateComment(
+            term_name + ': ', self._MAX_TERM_COMMENT_LENGTH
         )
 
         filtered_protocols = []
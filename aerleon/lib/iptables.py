@@ -16,7 +16,7 @@
 
 """Iptables generator."""
 
-import re
+import itertools
 from string import Template  # pylint: disable=g-importing-member
 
 from absl import logging
@@ -47,6 +47,16 @@ class Term(aclgenerator.Term):
         'ah': '-p ah',
         'gre': '-p gre',
     }
+    _ACTION_TABLE = {
+        'accept': '-j ACCEPT',
+        'deny': '-j DROP',
+        'reject': '-j REJECT --reject-with icmp-host-prohibited',
+        'reject-with-tcp-rst': '-j REJECT --reject-with tcp-reset',
+        'next': '-j RETURN',
+    }
+    _INET6_ACTION_TABLE = dict(
+        _ACTION_TABLE, reject='-j REJECT --reject-with icmp6-adm-prohibited'
+    )
     _TCP_FLAGS_TABLE = {
         'syn': 'SYN',
         'ack': 'ACK',
@@ -80,13 +90,6 @@ class Term(aclgenerator.Term):
           UnsupportedFilterError: Filter is not supported.
         """
         super().__init__(term)
-        self._action_table = {
-            'accept': '-j ACCEPT',
-            'deny': '-j DROP',
-            'reject': '-j REJECT --reject-with icmp-host-prohibited',
-            'reject-with-tcp-rst': '-j REJECT --reject-with tcp-reset',
-            'next': '-j RETURN',
-        }
         self.trackstate = trackstate
         self.term = term  # term object
         self.filter = filter_name  # actual name of filter
@@ -94,16 +97,33 @@ class Term(aclgenerator.Term):
         self.options = []
         self.af = af
         self.verbose = verbose
+        # _all_ips stays per term: collapsing address lists may add comments to it.
         if af == 'inet6':
             self._all_ips = nacaddr.IPv6('::/0')
-            self._action_table['reject'] = '-j REJECT --reject-with ' 'icmp6-adm-prohibited'
+            self._action_table = self._INET6_ACTION_TABLE
         else:
             self._all_ips = nacaddr.IPv4('0.0.0.0/0')
-            self._action_table['reject'] = '-j REJECT --reject-with ' 'icmp-host-prohibited'
+            self._action_table = self._ACTION_TABLE
 
         self.term_name = '%s_%s' % (self.filter[:1], self.term.name)
 
+        # _CalculateAddresses() result, computed on first render.
+        self._addresses = None
+
+        # Rule prefix shared by every line rendered for this term.
+        self._filter_top = self._FILTER_TOP_FORMAT.substitute(
+            filter=self.filter, term=self.term_name
+        )
+
     def __str__(self):
+        return '\n'.join(self.RenderLines())
+
+    def RenderLines(self):
+        """Render the term as a list of iptables-restore lines.
+
+        Returns:
+          list of lines; empty if the term renders nothing.
+        """
         ret_str = []
 
         # Don't render icmpv6 protocol terms under inet, or icmp under inet6
@@ -115,7 +135,7 @@ class Term(aclgenerator.Term):
                     term=self.term.name, proto=', '.join(self.term.protocol), af=self.af
                 )
             )
-            return ''
+            return []
 
         # Term verbatim output - this will skip over most normal term
         # creation code by returning early. Warnings provided in policy.py
@@ -123,7 +143,7 @@ class Term(aclgenerator.Term):
             for next_verbatim in self.term.verbatim:
                 if next_verbatim[0] == self._PLATFORM:
                     ret_str.append(str(next_verbatim[1]))
-            return '\n'.join(ret_str)
+            return ret_str
 
         # Create a new term
         self._SetDefaultAction()
@@ -180,43 +200,45 @@ class Term(aclgenerator.Term):
                         'iptables output.',
                     )
                 )
-            return '# skipped %s due to source or destination prefix rule' % self.term.name
+            return ['# skipped %s due to source or destination prefix rule' % self.term.name]
 
         # protocol
         if self.term.protocol:
-            protocol = self.term.protocol
+            protocol = [str(proto) for proto in self.term.protocol]
         else:
             protocol = ['all']
         if 'hopopt' in protocol and self.af == 'inet':
             logging.warning('Term %s is using hopopt in IPv4 context.', self.term_name)
-            return ''
-
-        (term_saddr, exclude_saddr, term_daddr, exclude_daddr) = self._CalculateAddresses(
-            self.term.source_address,
-            self.term.source_address_exclude,
-            self.term.destination_address,
-            self.term.destination_address_exclude,
-        )
+            return []
+
+        if self._addresses is None:
+            self._addresses = self._CalculateAddresses(
+                self.term.source_address,
+                self.term.source_address_exclude,
+                self.term.destination_address,
+                self.term.destination_address_exclude,
+            )
+        (term_saddr, exclude_saddr, term_daddr, exclude_daddr) = self._addresses
         if not term_saddr:
             logging.warning(
                 self.NO_AF_LOG_ADDR.substitute(term=self.term.name, direction='source', af=self.af)
             )
-            return ''
+            return []
         if not term_daddr:
             logging.warning(
                 self.NO_AF_LOG_ADDR.substitute(
                     term=self.term.name, direction='destination', af=self.af
                 )
             )
-            return ''
+            return []
 
         # ports
-        source_port = []
-        destination_port = []
+        source_ports = []
+        destination_ports = []
         if self.term.source_port:
-            source_port = self.term.source_port
+            source_ports = self._GeneratePortStatement(self.term.source_port, source=True)
         if self.term.destination_port:
-            destination_port = self.term.destination_port
+            destination_ports = self._GeneratePortStatement(self.term.destination_port, dest=True)
 
         # icmp-types
         icmp_types = ['']
@@ -232,10 +254,14 @@ class Term(aclgenerator.Term):
         if self.term.destination_interface:
             destination_interface = self.term.destination_interface
 
-        log_hits = False
+        log_jump = ''
         if self.term.logging:
             # Iptables sends logs to hosts configured syslog
-            log_hits = True
+            log_jump = self._LOG_FORMAT.substitute(term=self.term.name)
+            if self.term.log_limit:
+                log_jump = '-m --limit {}/{} {}'.format(
+                    self.term.log_limit[0], self.term.log_limit[1], log_jump
+                )
 
         # options
         tcp_flags = []
@@ -247,10 +273,8 @@ class Term(aclgenerator.Term):
             # Option established will add destination port high-ports if protocol
             # contains only tcp, udp or both.  This is done earlier in class Iptables.
             #
-            if (
-                next_opt.find('established') == 0 or next_opt.find('tcp-established') == 0
-            ) and 'ESTABLISHED' not in [x.strip() for x in self.options]:
-                if next_opt.find('tcp-established') == 0 and protocol != ['tcp']:
+            if next_opt.startswith(('established', 'tcp-established')):
+                if next_opt.startswith('tcp-established') and protocol != ['tcp']:
                     raise TcpEstablishedError(
                         '%s %s %s'
                         % (
@@ -272,9 +296,9 @@ class Term(aclgenerator.Term):
                     ]
 
             # Iterate through flags table, and create list of tcp-flags to append
-            for next_flag in self._TCP_FLAGS_TABLE:
-                if next_opt.find(next_flag) == 0:
-                    tcp_flags.append(self._TCP_FLAGS_TABLE.get(next_flag))
+            for next_flag, tcp_flag in self._TCP_FLAGS_TABLE.items():
+                if next_opt.startswith(next_flag):
+                    tcp_flags.append(tcp_flag)
             if next_opt in self._KNOWN_OPTIONS_MATCHERS:
                 self.options.append(self._KNOWN_OPTIONS_MATCHERS[next_opt])
         if self.term.packet_length:
@@ -290,13 +314,16 @@ class Term(aclgenerator.Term):
         if self.term.icmp_code:
             icmp_code = self.term.icmp_code
 
+        action = self._action_table.get(str(self.term.action[0]))
+
         for saddr in exclude_saddr:
+            src, dst = self._GenerateAddressStatement(saddr, '')
             ret_str.extend(
                 self._FormatPart(
                     '',
-                    saddr,
-                    '',
+                    src,
                     '',
+                    dst,
                     '',
                     '',
                     '',
@@ -310,12 +337,13 @@ class Term(aclgenerator.Term):
                 )
             )
         for daddr in exclude_daddr:
+            src, dst = self._GenerateAddressStatement('', daddr)
             ret_str.extend(
                 self._FormatPart(
                     '',
+                    src,
                     '',
-                    '',
-                    daddr,
+                    dst,
                     '',
                     '',
                     '',
@@ -331,35 +359,35 @@ class Term(aclgenerator.Term):
 
         for saddr in term_saddr:
             for daddr in term_daddr:
-                for icmp in icmp_types:
-                    for code in icmp_code:
-                        for proto in protocol:
-                            for tcp_matcher in tcp_track_options or (([], []),):
-                                ret_str.extend(
-                                    self._FormatPart(
-                                        str(proto),
-                                        saddr,
-                                        source_port,
-                                        daddr,
-                                        destination_port,
-                                        self.options,
-                                        tcp_flags,
-                                        icmp,
-                                        code,
-                                        tcp_matcher,
-                                        source_interface,
-                                        destination_interface,
-                                        log_hits,
-                                        self._action_table.get(str(self.term.action[0])),
-                                    )
-                                )
+                src, dst = self._GenerateAddressStatement(saddr, daddr)
+                for icmp, code, proto, tcp_matcher in itertools.product(
+                    icmp_types, icmp_code, protocol, tcp_track_options or (([], []),)
+                ):
+                    ret_str.extend(
+                        self._FormatPart(
+                            proto,
+                            src,
+                            source_ports,
+                            dst,
+                            destination_ports,
+                            self.options,
+                            tcp_flags,
+                            icmp,
+                            code,
+                            tcp_matcher,
+                            source_interface,
+                            destination_interface,
+                            log_jump,
+                            action,
+                        )
+                    )
 
         if self._POSTJUMP_FORMAT:
             ret_str.append(
                 self._POSTJUMP_FORMAT.substitute(filter=self.filter, term=self.term_name)
             )
 
-        return '\n'.join(str(v) for v in ret_str if v)
+        return [v for v in ret_str if v]
 
     def _CalculateAddresses(self, term_saddr, exclude_saddr, term_daddr, exclude_daddr):
         """Calculate source and destination address list for a term.
@@ -439,10 +467,10 @@ class Term(aclgenerator.Term):
     def _FormatPart(
         self,
         protocol,
-        saddr,
-        sport,
-        daddr,
-        dport,
+        src,
+        sports,
+        dst,
+        dports,
         options,
         tcp_flags,
         icmp_type,
@@ -450,17 +478,17 @@ class Term(aclgenerator.Term):
         track_flags,
         sint,
         dint,
-        log_hits,
+        log_jump,
         action,
     ):
         """Compose one iteration of the term parts into a string.
 
         Args:
           protocol: The network protocol
-          saddr: Source IP address
-          sport: Source port numbers
-          daddr: Destination IP address
-          dport: Destination port numbers
+          src: Source address statement
+          sports: Source port statements, if any
+          dst: Destination address statement
+          dports: Destination port statements, if any
           options: Optional arguments to append to our rule
           tcp_flags: Which tcp_flag arguments, if any, should be appended
           icmp_type: What icmp protocol to allow, if any
@@ -468,15 +496,11 @@ class Term(aclgenerator.Term):
           track_flags: A tuple of ([check-flags], [set-flags]) arguments to tcp-flag
           sint: Optional source interface
           dint: Optional destination interface
-          log_hits: Boolean, to log matches or not
+          log_jump: LOG jump rendered before the action, if matches are logged
           action: What should happen if this rule matches
         Returns:
           rval:  A single iptables argument line
         """
-        src, dst = self._GenerateAddressStatement(saddr, daddr)
-
-        filter_top = self._FILTER_TOP_FORMAT.substitute(filter=self.filter, term=self.term_name)
-
         source_int = ''
         if sint:
             source_int = '-i %s' % sint
@@ -485,21 +509,13 @@ class Term(aclgenerator.Term):
         if dint:
             destination_int = '-o %s' % dint
 
-        log_jump = ''
-        if log_hits:
-            log_jump = self._LOG_FORMAT.substitute(term=self.term.name)
-            if self.term.log_limit:
-                log_jump = '-m --limit {}/{} {}'.format(
-                    self.term.log_limit[0], self.term.log_limit[1], log_jump
-                )
-
         if not options:
             options = []
 
-        proto = self._PROTO_TABLE.get(str(protocol))
+        proto = self._PROTO_TABLE.get(protocol)
         # Don't drop protocol if we don't recognize it
         if protocol and not proto:
-            proto = '-p %s' % str(protocol)
+            proto = '-p %s' % protocol
 
         # TODO(vklimovs): generalize to all v6 special cases
         # Use u32 module as named modules are not available
@@ -542,60 +558,57 @@ class Term(aclgenerator.Term):
         icmp_type = str(icmp_type)
         if not icmp_type:
             icmp = ''
-        elif str(protocol) == 'icmpv6':
+        elif protocol == 'icmpv6':
             icmp = '-m icmp6 --icmpv6-type %s' % icmp_type
         else:
             icmp = '--icmp-type %s' % icmp_type
         if code:
             icmp += r'/%d' % code
 
-        # format tcp and udp ports
-        sports = dports = ['']
-        if sport:
-            sports = self._GeneratePortStatement(sport, source=True)
-        if dport:
-            dports = self._GeneratePortStatement(dport, dest=True)
+        if self.af == 'inet6' and protocol == 'all' and 'REJECT' in str(action):
+            # Due to a bug in ip6tables, when -p all and -j REJECT, proto
+            # is being eaten
+            proto = ''
 
         ret_lines = []
-        for sport in sports:
-            for dport in dports:
-                rval = [filter_top]
-                if re.search('multiport', sport) and not re.search('multiport', dport):
+        for sport in sports or ('',):
+            for dport in dports or ('',):
+                rval = [self._filter_top]
+                if 'multiport' in sport and 'multiport' not in dport:
                     # Due to bug in iptables, use of multiport module before a single
                     # port specification will result in multiport trying to consume it.
                     # this is a little hack to ensure single ports are listed before
                     # any multiport specification.
                     dport, sport = sport, dport
-                if str(protocol) == 'icmpv6':
+                if protocol == 'icmpv6':
                     # Due to a bug in ip6tables, iptables-save returns icmpv6 matches in
                     # order (address spec) (icmpv6 spec). Fake this using options
                     # datastructure.
                     options.extend((proto, icmp))
                     proto = ''
                     icmp = ''
-                if str(self.af) == 'inet6' and str(protocol) == 'all' and 'REJECT' in str(action):
-                    # Due to a bug in ip6tables, when -p all and -j REJECT, proto
-                    # is being eaten
-                    proto = ''
-                for value in (
-                    proto,
-                    flags,
-                    sport,
-                    dport,
-                    icmp,
-                    src,
-                    dst,
-                    ' '.join(options),
-                    source_int,
-                    destination_int,
-                ):
-                    if value:
-                        rval.append(str(value))
+                rval.extend(
+                    value
+                    for value in (
+                        proto,
+                        flags,
+                        sport,
+                        dport,
+                        icmp,
+                        src,
+                        dst,
+                        ' '.join(options),
+                        source_int,
+                        destination_int,
+                    )
+                    if value
+                )
+                rule = ' '.join(rval)
                 if log_jump:
                     # -j LOG
-                    ret_lines.append(' '.join(rval + [log_jump]))
+                    ret_lines.append('%s %s' % (rule, log_jump))
                 # -j ACTION
-                ret_lines.append(' '.join(rval + [action]))
+                ret_lines.append('%s %s' % (rule, action))
         return ret_lines
 
     def _GenerateAddressStatement(self, saddr, daddr):
@@ -610,15 +623,13 @@ class Term(aclgenerator.Term):
           that order
 
         """
+        # Addresses are already limited to the term's address family, so a /0
+        # is _all_ips; checking the prefix length avoids an address comparison.
         src = ''
         dst = ''
-        if not saddr or saddr == self._all_ips:
-            src = ''
-        else:
+        if saddr and saddr.prefixlen:
             src = '-s %s/%d' % (saddr.network_address, saddr.prefixlen)
-        if not daddr or daddr == self._all_ips:
-            dst = ''
-        else:
+        if daddr and daddr.prefixlen:
             dst = '-d %s/%d' % (daddr.network_address, daddr.prefixlen)
         return (src, dst)
 
@@ -919,9 +930,7 @@ class Iptables(aclgenerator.ACLGenerator):
                 target.append(self._DEFAULTACTION_FORMAT_CUSTOM_CHAIN % filter_name)
             # add the terms
             for term in terms:
-                term_str = str(term)
-                if term_str:
-                    target.append(term_str)
+                target.extend(term.RenderLines())
 
         if self._RENDER_SUFFIX:
             target.append(self._RENDER_SUFFIX)
@@ -14,11 +14,10 @@
 # limitations under the License.
 """Palo Alto Firewall generator."""
 
-import collections
 import copy
+import itertools
 import re
 import xml.etree.ElementTree as etree
-from xml.dom import minidom
 
 from absl import logging
 
@@ -65,16 +64,168 @@ class PaloAltoFWBadIcmpTypeError(Error):
     pass
 
 
+def _ClassifyFlows(v4_src, v4_dst, v6_src, v6_dst):
+    """Determine the IPv4 and IPv6 traffic flow patterns of a term.
+
+    Args:
+      v4_src: True if the term has IPv4 source addresses.
+      v4_dst: True if the term has IPv4 destination addresses.
+      v6_src: True if the term has IPv6 source addresses.
+      v6_dst: True if the term has IPv6 destination addresses.
+
+    Returns:
+      tuple of flow patterns, e.g. ("ip4-ip4", "ip6-src-only", "ip6-only")
+    """
+    src_any = not (v4_src or v6_src)
+    dst_any = not (v4_dst or v6_dst)
+    flows = []
+    for v, has_src, has_dst in ((4, v4_src, v4_dst), (6, v6_src, v6_dst)):
+        if src_any and dst_any:
+            flows.append("ip%d-ip%d" % (v, v))
+            continue
+        if (not has_src and not src_any) and (not has_dst and not dst_any):
+            continue
+        if (has_src or src_any) and (has_dst or dst_any):
+            flows.append("ip%d-ip%d" % (v, v))
+            continue
+        if (has_src or src_any) and not has_dst:
+            flows.append("ip%d-src-only" % v)
+            flows.append("ip%d-only" % v)
+            continue
+        if not has_src and (has_dst or dst_any):
+            flows.append("ip%d-dst-only" % v)
+            flows.append("ip%d-only" % v)
+    return tuple(flows)
+
+
+# Flow patterns keyed by (v4_src, v4_dst, v6_src, v6_dst), see _ClassifyFlows.
+_FLOW_TABLE = {key: _ClassifyFlows(*key) for key in itertools.product((False, True), repeat=4)}
+
+# Protocols rendered as port based services.
+_PORT_PROTOCOLS = frozenset(["tcp", "udp"])
+# Protocols rendered as applications of the same name.
+_APPLICATION_PROTOCOLS = frozenset(["igmp", "sctp", "gre"])
+# Protocols rendered as "ipsec-<protocol>" applications.
+_IPSEC_PROTOCOLS = frozenset(["ah", "esp"])
+
+# Address book entry names are "<parent token>_<count>".
+_ADDRESS_BOOK_NAME_RE = re.compile(r"^(.*)_(\d+)$")
+
+# Rule logging settings for each term logging value, "disable" aside.
+_LOGGING_SETTINGS = {
+    "log-both": ("log-start", "log-end"),
+    "True": ("log-end",),
+    "true": ("log-end",),
+    "syslog": ("log-end",),
+    "local": ("log-end",),
+}
+
+
+def _SplitAddresses(addresses, exclude_address_family):
+    """Split large IPv6 ranges and select the addresses for the address book.
+
+    IPv6 ranges with a prefix length of 1 or 2 are replaced by their /3 subnets.
+
+    Args:
+      addresses: list of nacaddr objects from a term.
+      exclude_address_family: set of IP versions left out of the address book.
+
+    Returns:
+      tuple of the split address list and the split addresses to add to the
+      address book.
+    """
+    split = []
+    included = []
+    for addr in addresses:
+        if addr.version == 6 and 0 < addr.prefixlen < 3:
+            subnets = list(addr.subnets(new_prefix=3))
+            for subnet in subnets:
+                subnet.parent_token = addr.parent_token
+        else:
+            subnets = [addr]
+        split.extend(subnets)
+        if addr.version not in exclude_address_family:
+            included.extend(subnets)
+    return split, included
+
+
+def _AppendMembers(parent, texts):
+    """Append a <member> element to parent for each of texts."""
+    sub_element = etree.SubElement
+    for text in texts:
+        sub_element(parent, "member").text = text
+
+
+def _EscapeXml(data):
+    """Escape XML character and attribute data like xml.dom.minidom does."""
+    return (
+        data.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;").replace(">", "&gt;")
+    )
+
+
+def _EscapeXmlAttr(data):
+    """Escape an attribute value, keeping whitespace an XML parser would normalize."""
+    return _EscapeXml(data).replace("\r", "&#13;").replace("\n", "&#10;").replace("\t", "&#9;")
+
+
+def _PrettyXmlText(text):
+    """Escape character data, normalizing line endings as an XML parser would."""
+    return _EscapeXml(text.replace("\r\n", "\n").replace("\r", "\n"))
+
+
+def _WritePrettyXml(element, indent, add_indent, out):
+    """Serialize an element tree in the xml.dom.minidom toprettyxml() layout.
+
+    This replaces serializing the tree and re-parsing it with minidom just to
+    pretty print it. An element holding only text is written inline. Otherwise
+    its text, each child and each child's tail go on separate indented lines.
+    The tail of the element passed in is not written, as it lies outside the
+    document. Tabs and line breaks in attribute values are written as
+    character references so that they survive attribute value normalization.
+
+    Args:
+      element: the xml.etree.ElementTree element to serialize
+      indent: current indentation
+      add_indent: indentation added for each nesting level
+      out: list the serialized fragments are appended to
+    """
+    if element.tag is etree.Comment:
+        out.append("%s<!--%s-->\n" % (indent, element.text))
+        return
+    out.append(indent + "<" + element.tag)
+    for name, value in element.items():
+        out.append(' %s="%s"' % (name, _EscapeXmlAttr(value)))
+    if len(element):
+        out.append(">\n")
+        child_indent = indent + add_indent
+        if element.text:
+            out.append("%s%s\n" % (child_indent, _PrettyXmlText(element.text)))
+        for child in element:
+            _WritePrettyXml(child, child_indent, add_indent, out)
+            if child.tail:
+                out.append("%s%s\n" % (child_indent, _PrettyXmlText(child.tail)))
+        out.append("%s</%s>\n" % (indent, element.tag))
+    elif element.text:
+        out.append(">%s</%s>\n" % (_PrettyXmlText(element.text), element.tag))
+    else:
+        out.append("/>\n")
+
+
 class ServiceMap:
     """Manages service names across a single policy instance."""
 
+    __slots__ = ("entries", "names")
+
     def __init__(self):
         self.entries = {}
+        self.names = set()
 
     def get_service_name(self, term_name, src_ports, ports, protocol, prefix=None):
         """Returns service name based on the provided ports and protocol."""
-        if (src_ports, ports, protocol) in self.entries:
-            return self.entries[(src_ports, ports, protocol)]["name"]
+        key = (src_ports, ports, protocol)
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry["name"]
 
         if prefix is None:
             prefix = "service-"
@@ -85,20 +236,21 @@ class ServiceMap:
                 "Service name must be 63 characters max: %s" % service_name
             )
 
-        for _, service in self.entries.items():
-            if service["name"] == service_name:
-                raise PaloAltoFWDuplicateServiceError(
-                    "You have a duplicate service. A service named %s already exists."
-                    % service_name
-                )
+        if service_name in self.names:
+            raise PaloAltoFWDuplicateServiceError(
+                "You have a duplicate service. A service named %s already exists." % service_name
+            )
 
-        self.entries[(src_ports, ports, protocol)] = {"name": service_name}
+        self.entries[key] = {"name": service_name}
+        self.names.add(service_name)
         return service_name
 
 
 class Rule:
     """Extend the Term() class for PaloAlto Firewall Rules."""
 
+    __slots__ = ("options",)
+
     def __init__(self, from_zone, to_zone, term, service_map):
         # Palo Alto Firewall rule keys
         MAX_ZONE_LENGTH = 31
@@ -125,8 +277,6 @@ class Rule:
         options["from_zone"] = [from_zone]
         options["to_zone"] = [to_zone]
         options["description"] = []
-        options["source"] = []
-        options["destination"] = []
         options["application"] = []
         options["service"] = []
         options["logging"] = []
@@ -144,7 +294,7 @@ class Rule:
             x = []
             for tup in ports:
                 if len(tup) > 1 and tup[0] != tup[1]:
-                    x.append(str(tup[0]) + "-" + str(tup[1]))
+                    x.append("%s-%s" % (tup[0], tup[1]))
                 else:
                     x.append(str(tup[0]))
 
@@ -155,36 +305,19 @@ class Rule:
             options["description"] = term.comment
 
         # LOGGING
-        if term.logging:
-            for item in term.logging:
-                if item.value in ["disable"]:
-                    options["logging"] = ["disable"]
-                    break
-                elif item.value in ["log-both"]:
-                    options["logging"].append("log-start")
-                    options["logging"].append("log-end")
-                elif item.value in ["True", "true", "syslog", "local"]:
-                    options["logging"].append("log-end")
+        for item in term.logging:
+            if item.value == "disable":
+                options["logging"] = ["disable"]
+                break
+            options["logging"].extend(_LOGGING_SETTINGS.get(item.value, ()))
 
         # SOURCE-ADDRESS
-        if term.source_address:
-            saddr_check = set()
-            for saddr in term.source_address:
-                saddr_check.add(saddr.parent_token)
-            saddr_check = sorted(saddr_check)
-            for addr in saddr_check:
-                options["source"].append(str(addr))
         # missing source handled during XML document generation
+        options["source"] = sorted({addr.parent_token for addr in term.source_address})
 
         # DESTINATION-ADDRESS
-        if term.destination_address:
-            daddr_check = set()
-            for daddr in term.destination_address:
-                daddr_check.add(daddr.parent_token)
-            daddr_check = sorted(daddr_check)
-            for addr in daddr_check:
-                options["destination"].append(str(addr))
         # missing destination handled during XML document generation
+        options["destination"] = sorted({addr.parent_token for addr in term.destination_address})
 
         # ACTION
         if term.action:
@@ -211,8 +344,9 @@ class Rule:
                     options["service"].append(service_name)
 
         elif "tcp" in term.protocol or "udp" in term.protocol:
-            services = {"tcp", "udp"} & set(term.protocol)
-            others = set(term.protocol) - services
+            protocols = set(term.protocol)
+            services = _PORT_PROTOCOLS & protocols
+            others = protocols - services
             if others:
                 logging.info(
                     "INFO: Term %s in policy %s>%s contains port-less %s "
@@ -239,11 +373,11 @@ class Rule:
             # if missing.
             for proto_name in term.protocol:
                 if (
-                    proto_name in ["igmp", "sctp", "gre"]
+                    proto_name in _APPLICATION_PROTOCOLS
                     and proto_name not in options["application"]
                 ):
                     options["application"].append(proto_name)
-                elif proto_name in ("ah", "esp"):
+                elif proto_name in _IPSEC_PROTOCOLS:
                     ipsec_app_proto = "ipsec-%s" % proto_name
                     if ipsec_app_proto not in options["application"]:
                         options["application"].append(ipsec_app_proto)
@@ -261,21 +395,25 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
     _TERM_MAX_LENGTH = 63
     _APPLICATION_NAME_MAX_LENGTH = 31
     _TERM_PREFIX_LENGTH = 24
-    _SUPPORTED_PROTO_NAMES = [
-        "tcp",
-        "udp",
-        "icmp",
-        "icmpv6",
-        "sctp",
-        "igmp",
-        "gre",
-        "ah",
-        "esp",
-    ]
+    _SUPPORTED_PROTO_NAMES = frozenset(
+        [
+            "tcp",
+            "udp",
+            "icmp",
+            "icmpv6",
+            "sctp",
+            "igmp",
+            "gre",
+            "ah",
+            "esp",
+        ]
+    )
     _MAX_RULE_DESCRIPTION_LENGTH = 1024
     _MAX_TAG_COMMENTS_LENGTH = 1023
     _TAG_NAME_FORMAT = "{from_zone}_{to_zone}_policy-comment-{num}"
     _MAX_RULE_SRC_DST_MEMBERS = 65535
+    # Terms with these options are not rendered.
+    _SKIPPED_TERM_OPTIONS = frozenset(["established", "tcp-established"])
 
     _ABBREVIATION_TABLE = [
         # Service abbreviations first.
@@ -319,7 +457,6 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
     def __init__(self, pol, exp_info):
         self.pafw_policies = []
         self.addressbook = addressbook.Addressbook()
-        self.applications = []
         self.application_refs = {}
         self.application_groups = []
         self.pan_applications = []
@@ -448,34 +585,21 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                 )
 
             term_dup_check = set()
-            new_terms = []
+            # Create a ruleset. It contains the rules for the terms defined under
+            # a single header on a particular platform.
+            ruleset = {}
 
             for term in terms:
-                if term.stateless_reply:
-                    logging.warning(
-                        "WARNING: Term %s in policy %s>%s is a stateless reply "
-                        "term and will not be rendered.",
-                        term.name,
-                        self.from_zone,
-                        self.to_zone,
-                    )
-                    continue
-                if "established" in term.option:
+                skipped_options = self._SKIPPED_TERM_OPTIONS.intersection(term.option)
+                if term.stateless_reply or skipped_options:
                     logging.warning(
-                        "WARNING: Term %s in policy %s>%s is a established "
-                        "term and will not be rendered.",
-                        term.name,
-                        self.from_zone,
-                        self.to_zone,
-                    )
-                    continue
-                if "tcp-established" in term.option:
-                    logging.warning(
-                        "WARNING: Term %s in policy %s>%s is a tcp-established "
+                        "WARNING: Term %s in policy %s>%s is a %s "
                         "term and will not be rendered.",
                         term.name,
                         self.from_zone,
                         self.to_zone,
+                        # "established" sorts first, as it was checked first.
+                        "stateless reply" if term.stateless_reply else min(skipped_options),
                     )
                     continue
 
@@ -494,8 +618,7 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                     raise PaloAltoFWDuplicateTermError("You have a duplicate term: %s" % term.name)
                 term_dup_check.add(term.name)
 
-                services = {"tcp", "udp"} & set(term.protocol)
-                others = set(term.protocol) - services
+                others = set(term.protocol) - _PORT_PROTOCOLS
                 if others and term.pan_application:
                     raise UnsupportedFilterError(
                         "Term %s contains non tcp, udp protocols with pan-application: %s: %s"
@@ -512,43 +635,22 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
 
                 # Count the number of occurencies of a particular version of the
                 # address family, i.e. v4/v6 in source and destination IP addresses.
-                afc = {
-                    4: {"src": 0, "dst": 0},
-                    6: {"src": 0, "dst": 0},
-                }
+                v4_src = v6_src = v4_dst = v6_dst = 0
                 # Determine the address families in the source and destination
-                # addresses references in the term. Next, determine IPv4 and IPv6
+                # addresses references in the term. Next, look up the IPv4 and IPv6
                 # traffic flow patterns.
-                exclude_address_family = []
-                flows = []
-                src_any = False
-                dst_any = False
-                if not term.source_address:
-                    src_any = True
-                if not term.destination_address:
-                    dst_any = True
+                exclude_address_family = set()
                 for addr in term.source_address:
-                    afc[addr.version]["src"] += 1
+                    if addr.version == 4:
+                        v4_src += 1
+                    else:
+                        v6_src += 1
                 for addr in term.destination_address:
-                    afc[addr.version]["dst"] += 1
-                for v in [4, 6]:
-                    if src_any and dst_any:
-                        flows.append("ip%d-ip%d" % (v, v))
-                        continue
-                    if (afc[v]["src"] == 0 and not src_any) and (
-                        afc[v]["dst"] == 0 and not dst_any
-                    ):
-                        continue
-                    if (afc[v]["src"] > 0 or src_any) and (afc[v]["dst"] > 0 or dst_any):
-                        flows.append("ip%d-ip%d" % (v, v))
-                        continue
-                    if (afc[v]["src"] > 0 or src_any) and afc[v]["dst"] == 0:
-                        flows.append("ip%d-src-only" % v)
-                        flows.append("ip%d-only" % v)
-                        continue
-                    if afc[v]["src"] == 0 and (afc[v]["dst"] > 0 or dst_any):
-                        flows.append("ip%d-dst-only" % v)
-                        flows.append("ip%d-only" % v)
+                    if addr.version == 4:
+                        v4_dst += 1
+                    else:
+                        v6_dst += 1
+                flows = _FLOW_TABLE[(v4_src > 0, v4_dst > 0, v6_src > 0, v6_dst > 0)]
 
                 if filter_type == "inet":
                     if "icmpv6" in term.protocol:
@@ -567,11 +669,11 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                             term.name,
                             self.from_zone,
                             self.to_zone,
-                            flows,
+                            list(flows),
                         )
                         continue
                     # exclude IPv6 addresses
-                    exclude_address_family.append(6)
+                    exclude_address_family.add(6)
                 elif filter_type == "inet6":
                     if "icmp" in term.protocol:
                         logging.warning(
@@ -589,16 +691,16 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                             term.name,
                             self.from_zone,
                             self.to_zone,
-                            flows,
+                            list(flows),
                         )
                         continue
-                    exclude_address_family.append(4)
+                    exclude_address_family.add(4)
                 elif filter_type == "mixed":
                     if "ip4-ip4" in flows and "ip6-ip6" not in flows:
-                        exclude_address_family.append(6)
+                        exclude_address_family.add(6)
                         pass
                     elif "ip6-ip6" in flows and "ip4-ip4" not in flows:
-                        exclude_address_family.append(4)
+                        exclude_address_family.add(4)
                         pass
                     elif "ip4-ip4" in flows and "ip6-ip6" in flows:
                         pass
@@ -610,7 +712,7 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                             term.name,
                             self.from_zone,
                             self.to_zone,
-                            filter(lambda p: re.search(p, "(src|dst)-only"), flows),
+                            [f for f in flows if f.endswith(("src-only", "dst-only"))],
                         )
                         continue
                     else:
@@ -620,56 +722,28 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                             term.name,
                             self.from_zone,
                             self.to_zone,
-                            filter(lambda p: re.search(p, "(src|dst)-only"), flows),
+                            [f for f in flows if f.endswith(("src-only", "dst-only"))],
                         )
                         if "ip4-ip4" in flows:
-                            exclude_address_family.append(6)
+                            exclude_address_family.add(6)
                         else:
-                            exclude_address_family.append(4)
+                            exclude_address_family.add(4)
 
                 # Substitute large IPv6 ranges (/1, /2) with equivalent subnets.
                 # Do this separately from address book building, or during policy
                 # translation to account for both address-objects and no-address-objects
                 if term.source_address:
-                    saddr_split = []
-                    for saddr in term.source_address:
-                        if saddr.version == 6 and 0 < saddr.prefixlen < 3:
-                            for saddr2 in saddr.subnets(new_prefix=3):
-                                saddr2.parent_token = saddr.parent_token
-                                saddr_split.append(saddr2)
-                        else:
-                            saddr_split.append(saddr)
-                    term.source_address = saddr_split
-                    source_address = [
-                        addr
-                        for addr in term.source_address
-                        if addr.version not in exclude_address_family
-                    ]
+                    term.source_address, source_address = _SplitAddresses(
+                        term.source_address, exclude_address_family
+                    )
                     if source_address:
-                        self.addressbook.AddAddresses(
-                            '',
-                            source_address,
-                        )
+                        self.addressbook.AddAddresses('', source_address)
                 if term.destination_address:
-                    daddr_split = []
-                    for daddr in term.destination_address:
-                        if daddr.version == 6 and 0 < daddr.prefixlen < 3:
-                            for daddr2 in daddr.subnets(new_prefix=3):
-                                daddr2.parent_token = daddr.parent_token
-                                daddr_split.append(daddr2)
-                        else:
-                            daddr_split.append(daddr)
-                    term.destination_address = daddr_split
-                    destination_address = [
-                        addr
-                        for addr in term.destination_address
-                        if addr.version not in exclude_address_family
-                    ]
+                    term.destination_address, destination_address = _SplitAddresses(
+                        term.destination_address, exclude_address_family
+                    )
                     if destination_address:
-                        self.addressbook.AddAddresses(
-                            '',
-                            destination_address,
-                        )
+                        self.addressbook.AddAddresses('', destination_address)
 
                 # Handle ICMP/ICMPv6 terms.
                 if term.icmp_type and (
@@ -702,6 +776,8 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                         icmp_type_keyword = "ident-by-icmp-type"
                         # The risk level 4 is the default PANOS' risk level for ICMP.
                         risk_level = 4
+                        icmp_types = policy.Term.ICMP_TYPE[4]
+                        icmp_app_prefix = "icmp-"
                     else:
                         if filter_type == "inet":
                             continue
@@ -711,36 +787,23 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                         icmp_type_keyword = "ident-by-icmp6-type"
                         # The risk level 2 is the default PANOS' risk level for ICMPv6.
                         risk_level = 2
+                        icmp_types = policy.Term.ICMP_TYPE[6]
+                        icmp_app_prefix = "icmp6-"
                     # The term contains ICMP types
                     for term_icmp_type_name in term.icmp_type:
-                        if icmp_version == "icmp":
-                            icmp_app_name = "icmp-%s" % term_icmp_type_name
-                            # This is to abbreviate the Application name where possible.
-                            # The limit is defined by _APPLICATION_NAME_MAX_LENGTH = 31.
-                            if len(icmp_app_name) > self._APPLICATION_NAME_MAX_LENGTH:
-                                icmp_app_name = self.FixTermLength(
-                                    icmp_app_name, True, True, self._APPLICATION_NAME_MAX_LENGTH
-                                )
-                            if term_icmp_type_name not in policy.Term.ICMP_TYPE[4]:
-                                raise PaloAltoFWBadIcmpTypeError(
-                                    "term with bad icmp type: %s, icmp_type: %s"
-                                    % (term.name, term_icmp_type_name)
-                                )
-                            term_icmp_type = policy.Term.ICMP_TYPE[4][term_icmp_type_name]
-                        else:
-                            icmp_app_name = "icmp6-%s" % term_icmp_type_name
-                            # This is to abbreviate the Application name where possible.
-                            # The limit is defined by _APPLICATION_NAME_MAX_LENGTH = 31.
-                            if len(icmp_app_name) > self._APPLICATION_NAME_MAX_LENGTH:
-                                icmp_app_name = self.FixTermLength(
-                                    icmp_app_name, True, True, self._APPLICATION_NAME_MAX_LENGTH
-                                )
-                            if term_icmp_type_name not in policy.Term.ICMP_TYPE[6]:
-                                raise PaloAltoFWBadIcmpTypeError(
-                                    "term with bad icmp type: %s, icmp_type: %s"
-                                    % (term.name, term_icmp_type_name)
-                                )
-                            term_icmp_type = policy.Term.ICMP_TYPE[6][term_icmp_type_name]
+                        icmp_app_name = icmp_app_prefix + term_icmp_type_name
+                        # This is to abbreviate the Application name where possible.
+                        # The limit is defined by _APPLICATION_NAME_MAX_LENGTH = 31.
+                        if len(icmp_app_name) > self._APPLICATION_NAME_MAX_LENGTH:
+                            icmp_app_name = self.FixTermLength(
+                                icmp_app_name, True, True, self._APPLICATION_NAME_MAX_LENGTH
+                            )
+                        term_icmp_type = icmp_types.get(term_icmp_type_name)
+                        if term_icmp_type is None:
+                            raise PaloAltoFWBadIcmpTypeError(
+                                "term with bad icmp type: %s, icmp_type: %s"
+                                % (term.name, term_icmp_type_name)
+                            )
                         if icmp_app_name not in self.application_refs:
                             # the custom icmp application doesn't already exist
                             app_entry = {
@@ -754,7 +817,6 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                                 "risk": "%d" % risk_level,
                             }
                             self.application_refs[icmp_app_name] = app_entry
-                            self.applications.append(icmp_app_name)
 
                         # always add the ICMP application to the term, it either already
                         # existed due to a previous policy, or it was created in the
@@ -786,13 +848,6 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                             % ('icmp-type specified for non-icmp protocols in term:', term.name)
                         )
 
-                new_terms.append(term)
-
-            # Create a ruleset. It contains the rules for the terms defined under
-            # a single header on a particular platform.
-            ruleset = {}
-
-            for term in new_terms:
                 current_rule = Rule(self.from_zone, self.to_zone, term, self.service_map)
                 if len(current_rule.options) > 1:
                     for i, v in enumerate(current_rule.options):
@@ -813,15 +868,10 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
         Returns:
           returns the characters and number
         """
-        item_list = item.split("_")
-        num = item_list.pop(-1)
-        if isinstance(item_list[-1], int):
-            set_number = item_list.pop(-1)
-            num = int(set_number) * 1000 + int(num)
-        alpha = "_".join(item_list)
-        if num:
-            return (alpha, int(num))
-        return (alpha, 0)
+        match = _ADDRESS_BOOK_NAME_RE.match(item)
+        if match:
+            return (match.group(1), int(match.group(2)))
+        return (item, 0)
 
     def _BuildPort(self, ports):
         """Transform specified ports into list and ranges.
@@ -837,11 +887,36 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
             if i[0] == i[1]:
                 port_list.append(str(i[0]))
             else:
-                port_list.append("%s-%s" % (str(i[0]), str(i[1])))
+                port_list.append("%s-%s" % (i[0], i[1]))
         return port_list
 
+    def _RuleAddressMembers(
+        self, tokens, no_addr_obj, address_book_names_dict, address_book_groups_dict
+    ):
+        """Return the source or destination members of a rule.
+
+        Args:
+          tokens: list of address book group names referenced by the rule
+          no_addr_obj: True if addresses are rendered inline instead of as objects
+          address_book_names_dict: address book entry name to address
+          address_book_groups_dict: address book group name to entry names
+
+        Returns:
+          list of member strings
+        """
+        if not no_addr_obj:
+            return tokens
+        return [
+            address_book_names_dict[name]
+            for token in tokens
+            for name in address_book_groups_dict[token]
+        ]
+
     def __str__(self):
         """Render the output of the PaloAltoFirewall policy into config."""
+        Element = etree.Element
+        SubElement = etree.SubElement
+        Comment = etree.Comment
 
         # IPv4 addresses are normalized into the policy as IPv6 addresses
         # using ::<ipv4-address>.  The 0.0.0.0-255.255.255.255 range is
@@ -854,13 +929,11 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
         # Name to IP addresses
         address_book_names_dict = {}
         address_book_groups_dict = {}
-        try:
-            groups = sorted(self.addressbook.addressbook[''].keys())
-        except:
-            groups = []
+        zone_book = self.addressbook.addressbook.get('', {})
+        groups = sorted(zone_book)
         for group in groups:
             count = 0
-            for ip in self.addressbook.addressbook[''][group]:
+            for ip in zone_book[group]:
                 name = f'{ip.parent_token}_{count}'
                 count = count + 1
                 address = ip.with_prefixlen
@@ -869,41 +942,33 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                         continue
                 address_book_names_dict[name] = address
 
-            # building individual address-group dictionary
-            for nested_group in groups:
-                group_names = [i for i in address_book_names_dict.keys() if nested_group in i]
-
-                address_book_groups_dict[nested_group] = group_names
+        # building individual address-group dictionary, in sorted group order
+        for nested_group in groups:
+            address_book_groups_dict[nested_group] = [
+                i for i in address_book_names_dict if nested_group in i
+            ]
 
-        # sort address books and address sets
-        address_book_groups_dict = collections.OrderedDict(
-            sorted(address_book_groups_dict.items())
-        )
-        address_book_keys = sorted(
-            list(address_book_names_dict.keys()), key=self._SortAddressBookNumCheck
-        )
+        # sort address books
+        address_book_keys = sorted(address_book_names_dict, key=self._SortAddressBookNumCheck)
 
         # INITAL CONFIG
-        config = etree.Element("config", {"urldb": "paloaltonetworks", "version": "8.1.0"})
-        devices = etree.SubElement(config, "devices")
-        device_entry = etree.SubElement(devices, "entry", {"name": "localhost.localdomain"})
-        vsys = etree.SubElement(device_entry, "vsys")
-        vsys_entry = etree.SubElement(vsys, "entry", {"name": "vsys1"})
+        config = Element("config", {"urldb": "paloaltonetworks", "version": "8.1.0"})
+        devices = SubElement(config, "devices")
+        device_entry = SubElement(devices, "entry", {"name": "localhost.localdomain"})
+        vsys = SubElement(device_entry, "vsys")
+        vsys_entry = SubElement(vsys, "entry", {"name": "vsys1"})
 
         # APPLICATION
-        app_entries = etree.Element("application")
-        for app_name in self.applications:
-            if app_name not in self.application_refs:
-                # this is not a custom application.
-                continue
-            app = self.application_refs[app_name]
-            app_entry = etree.SubElement(app_entries, "entry", {"name": app_name})
-            for k in self.application_refs[app_name]:
+        app_entries = Element("application")
+        # application_refs only holds custom applications, in creation order.
+        for app_name, app in self.application_refs.items():
+            app_entry = SubElement(app_entries, "entry", {"name": app_name})
+            for k in app:
                 if isinstance(app[k], (str)):
-                    etree.SubElement(app_entry, k).text = app[k]
+                    SubElement(app_entry, k).text = app[k]
                 elif isinstance(app[k], (dict)):
                     if k == "default":
-                        default_props = etree.SubElement(app_entry, "default")
+                        default_props = SubElement(app_entry, "default")
                     else:
                         continue
                     for prop in app[k]:
@@ -911,42 +976,34 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                             "ident-by-icmp-type",
                             "ident-by-icmp6-type",
                         ]:
-                            icmp_type_props = etree.SubElement(default_props, prop)
-                            etree.SubElement(icmp_type_props, "type").text = app[k][prop]
+                            icmp_type_props = SubElement(default_props, prop)
+                            SubElement(icmp_type_props, "type").text = app[k][prop]
                         else:
                             pass
         vsys_entry.append(app_entries)
 
         # APPLICATION GROUPS
-        etree.SubElement(vsys_entry, "application-group")
+        SubElement(vsys_entry, "application-group")
 
         # SERVICES
-        vsys_entry.append(etree.Comment(" Services "))
-        service = etree.SubElement(vsys_entry, "service")
+        vsys_entry.append(Comment(" Services "))
+        service = SubElement(vsys_entry, "service")
         for k, v in self.service_map.entries.items():
-            entry = etree.SubElement(service, "entry", {"name": v["name"]})
-            proto0 = etree.SubElement(entry, "protocol")
-            proto = etree.SubElement(proto0, k[2])
+            entry = SubElement(service, "entry", {"name": v["name"]})
+            proto0 = SubElement(entry, "protocol")
+            proto = SubElement(proto0, k[2])
             # destination port
-            port = etree.SubElement(proto, "port")
-            tup = str(k[1])[1:-1]
-            if tup[-1] == ",":
-                tup = tup[:-1]
-            port.text = tup.replace("'", "").replace(", ", ",")
+            SubElement(proto, "port").text = ",".join(k[1])
             # source port
-            if len(k[0]):
-                sport = etree.SubElement(proto, "source-port")
-                tup = str(k[0])[1:-1]
-                if tup[-1] == ",":
-                    tup = tup[:-1]
-                sport.text = tup.replace("'", "").replace(", ", ",")
+            if k[0]:
+                SubElement(proto, "source-port").text = ",".join(k[0])
 
         # RULES
-        vsys_entry.append(etree.Comment(" Rules "))
-        rulebase = etree.SubElement(vsys_entry, "rulebase")
-        security = etree.SubElement(rulebase, "security")
-        rules = etree.SubElement(security, "rules")
-        tag = etree.Element("tag")
+        vsys_entry.append(Comment(" Rules "))
+        rulebase = SubElement(vsys_entry, "rulebase")
+        security = SubElement(rulebase, "security")
+        rules = SubElement(security, "rules")
+        tag = Element("tag")
 
         tag_num = 0
 
@@ -962,8 +1019,8 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                     tag_name = self._TAG_NAME_FORMAT.format(
                         from_zone=filter_options[1], to_zone=filter_options[3], num=tag_num
                     )
-                    tag_entry = etree.SubElement(tag, "entry", {"name": tag_name})
-                    comments = etree.SubElement(tag_entry, "comments")
+                    tag_entry = SubElement(tag, "entry", {"name": tag_name})
+                    comments = SubElement(tag_entry, "comments")
                     if len(comment) > self._MAX_TAG_COMMENTS_LENGTH:
                         logging.warning(
                             "WARNING: tag %s comments exceeds maximum " "length %d, truncated.",
@@ -977,9 +1034,9 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
             )
 
             for name, options in pa_rules.items():
-                entry = etree.SubElement(rules, "entry", {"name": name})
+                entry = SubElement(rules, "entry", {"name": name})
                 if options["description"]:
-                    descr = etree.SubElement(entry, "description")
+                    descr = SubElement(entry, "description")
                     x = " ".join(options["description"])
                     if len(x) > self._MAX_RULE_DESCRIPTION_LENGTH:
                         logging.warning(
@@ -990,22 +1047,14 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                         )
                     descr.text = x[: self._MAX_RULE_DESCRIPTION_LENGTH]
 
-                to = etree.SubElement(entry, "to")
-                for x in options["to_zone"]:
-                    member = etree.SubElement(to, "member")
-                    member.text = x
-
-                from_ = etree.SubElement(entry, "from")
-                for x in options["from_zone"]:
-                    member = etree.SubElement(from_, "member")
-                    member.text = x
+                _AppendMembers(SubElement(entry, "to"), options["to_zone"])
+                _AppendMembers(SubElement(entry, "from"), options["from_zone"])
 
                 af = filter_options[4] if len(filter_options) > 4 else "inet"
 
-                max_src_dst = 0
-                source = etree.SubElement(entry, "source")
+                source = SubElement(entry, "source")
                 if not options["source"]:
-                    member = etree.SubElement(source, "member")
+                    member = SubElement(source, "member")
                     if not options["destination"] and af != "mixed":
                         # only inet and inet6 use the any-ipv4 object
                         member.text = "any-ipv4"
@@ -1013,27 +1062,22 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                     else:
                         member.text = "any"
                 else:
-                    for x in options["source"]:
-                        if no_addr_obj:
-                            for group in address_book_groups_dict[x]:
-                                member = etree.SubElement(source, "member")
-                                member.text = str(address_book_names_dict[group])
-                                max_src_dst += 1
-                        else:
-                            member = etree.SubElement(source, "member")
-                            member.text = x
-                            max_src_dst += 1
-
-                if max_src_dst > self._MAX_RULE_SRC_DST_MEMBERS:
-                    raise UnsupportedFilterError(
-                        "term %s source members exceeds maximum of %d: %d"
-                        % (name, self._MAX_RULE_SRC_DST_MEMBERS, max_src_dst)
+                    members = self._RuleAddressMembers(
+                        options["source"],
+                        no_addr_obj,
+                        address_book_names_dict,
+                        address_book_groups_dict,
                     )
+                    if len(members) > self._MAX_RULE_SRC_DST_MEMBERS:
+                        raise UnsupportedFilterError(
+                            "term %s source members exceeds maximum of %d: %d"
+                            % (name, self._MAX_RULE_SRC_DST_MEMBERS, len(members))
+                        )
+                    _AppendMembers(source, members)
 
-                max_src_dst = 0
-                dest = etree.SubElement(entry, "destination")
+                dest = SubElement(entry, "destination")
                 if not options["destination"]:
-                    member = etree.SubElement(dest, "member")
+                    member = SubElement(dest, "member")
                     if options["source"]:
                         member.text = "any"
                     else:
@@ -1042,82 +1086,74 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
                             member.text = "any-ipv4"
                             if af == "inet6":
                                 for x in ["negate-source", "negate-destination"]:
-                                    negate = etree.SubElement(entry, x)
+                                    negate = SubElement(entry, x)
                                     negate.text = "yes"
                         else:
                             member.text = "any"
                 else:
-                    for x in options["destination"]:
-                        if no_addr_obj:
-                            for group in address_book_groups_dict[x]:
-                                member = etree.SubElement(dest, "member")
-                                member.text = str(address_book_names_dict[group])
-                                max_src_dst += 1
-                        else:
-                            member = etree.SubElement(dest, "member")
-                            member.text = x
-                            max_src_dst += 1
-
-                if max_src_dst > self._MAX_RULE_SRC_DST_MEMBERS:
-                    raise UnsupportedFilterError(
-                        "term %s destination members exceeds maximum of %d: %d"
-                        % (name, self._MAX_RULE_SRC_DST_MEMBERS, max_src_dst)
+                    members = self._RuleAddressMembers(
+                        options["destination"],
+                        no_addr_obj,
+                        address_book_names_dict,
+                        address_book_groups_dict,
                     )
+                    if len(members) > self._MAX_RULE_SRC_DST_MEMBERS:
+                        raise UnsupportedFilterError(
+                            "term %s destination members exceeds maximum of %d: %d"
+                            % (name, self._MAX_RULE_SRC_DST_MEMBERS, len(members))
+                        )
+                    _AppendMembers(dest, members)
 
                 # service section of a policy rule.
-                service = etree.SubElement(entry, "service")
+                service = SubElement(entry, "service")
                 if not options["service"] and not options["application"]:
-                    member = etree.SubElement(service, "member")
+                    member = SubElement(service, "member")
                     member.text = "any"
                 elif not options["service"] and options["application"]:
                     # Adds custom applications.
-                    member = etree.SubElement(service, "member")
+                    member = SubElement(service, "member")
                     member.text = "application-default"
                 else:
                     # Adds services.
-                    for x in options["service"]:
-                        member = etree.SubElement(service, "member")
-                        member.text = x
+                    _AppendMembers(service, options["service"])
 
                 # ACTION
-                action = etree.SubElement(entry, "action")
+                action = SubElement(entry, "action")
                 action.text = options["action"]
 
                 # check whether the rule is interzone
                 if list(set(options["from_zone"]).difference(options["to_zone"])):
-                    type_ = etree.SubElement(entry, "rule-type")
+                    type_ = SubElement(entry, "rule-type")
                     type_.text = "interzone"
                 elif not options["from_zone"] and not options["to_zone"]:
-                    type_ = etree.SubElement(entry, "rule-type")
+                    type_ = SubElement(entry, "rule-type")
                     type_.text = "interzone"
 
                 # APPLICATION
-                app = etree.SubElement(entry, "application")
+                app = SubElement(entry, "application")
                 if not options["application"]:
-                    member = etree.SubElement(app, "member")
+                    member = SubElement(app, "member")
                     member.text = "any"
                 else:
-                    for x in sorted(options["application"]):
-                        member = etree.SubElement(app, "member")
-                        member.text = x
+                    _AppendMembers(app, sorted(options["application"]))
 
                 if tag_name is not None:
-                    rules_tag = etree.SubElement(entry, "tag")
-                    member = etree.SubElement(rules_tag, "member")
+                    rules_tag = SubElement(entry, "tag")
+                    member = SubElement(rules_tag, "member")
                     member.text = tag_name
 
                 # LOGGING
                 if options["logging"]:
                     if "disable" in options["logging"]:
-                        log = etree.SubElement(entry, "log-start")
+                        log = SubElement(entry, "log-start")
                         log.text = "no"
-                        log = etree.SubElement(entry, "log-end")
+                        log = SubElement(entry, "log-end")
                         log.text = "no"
                     if "log-start" in options["logging"]:
-                        log = etree.SubElement(entry, "log-start")
+                        log = SubElement(entry, "log-start")
                         log.text = "yes"
                     if "log-end" in options["logging"]:
-                        log = etree.SubElement(entry, "log-end")
+                        log = SubElement(entry, "log-end")
                         log.text = "yes"
 
         # pytype: enable=key-error
@@ -1127,39 +1163,33 @@ class PaloAltoFW(aclgenerator.ACLGenerator):
             address_book_keys = {}
 
         # ADDRESS
-        vsys_entry.append(etree.Comment(" Address Groups "))
-        addr_group = etree.SubElement(vsys_entry, "address-group")
+        vsys_entry.append(Comment(" Address Groups "))
+        addr_group = SubElement(vsys_entry, "address-group")
 
         for group, address_list in address_book_groups_dict.items():
-            entry = etree.SubElement(addr_group, "entry", {"name": group})
-            static = etree.SubElement(entry, "static")
-            for name in address_list:
-                member = etree.SubElement(static, "member")
-                member.text = name
+            entry = SubElement(addr_group, "entry", {"name": group})
+            _AppendMembers(SubElement(entry, "static"), address_list)
 
-        vsys_entry.append(etree.Comment(" Addresses "))
-        addr = etree.SubElement(vsys_entry, "address")
+        vsys_entry.append(Comment(" Addresses "))
+        addr = SubElement(vsys_entry, "address")
 
         for name in address_book_keys:
-            entry = etree.SubElement(addr, "entry", {"name": name})
-            desc = etree.SubElement(entry, "description")
-            desc.text = name
-            ip = etree.SubElement(entry, "ip-netmask")
-            ip.text = str(address_book_names_dict[name])
+            entry = SubElement(addr, "entry", {"name": name})
+            SubElement(entry, "description").text = name
+            SubElement(entry, "ip-netmask").text = address_book_names_dict[name]
 
         if add_any_ipv4:
-            entry = etree.SubElement(addr, "entry", {"name": "any-ipv4"})
-            desc = etree.SubElement(entry, "description")
+            entry = SubElement(addr, "entry", {"name": "any-ipv4"})
+            desc = SubElement(entry, "description")
             desc.text = (
                 "Object to match all IPv4 addresses; " "negate to match all IPv6 addresses."
             )
-            range = etree.SubElement(entry, "ip-range")
+            range = SubElement(entry, "ip-range")
             range.text = ANY_IPV4_RANGE
 
         vsys_entry.append(tag)
 
         self.config = config
-        document = etree.tostring(config, encoding="UTF-8")
-        dom = minidom.parseString(document.decode("UTF-8"))
-
-        return dom.toprettyxml(indent=self.INDENT)
+        out = ['<?xml version="1.0" ?>\n']
+        _WritePrettyXml(config, "", self.INDENT, out)
+        return "".join(out)
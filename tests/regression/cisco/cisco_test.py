@@ -338,6 +338,12 @@ term good_term_23 {
   action:: accept
 }
 """
+GOOD_TERM_24 = """
+term good_term_24 {
+  protocol:: pcp
+  action:: accept
+}
+"""
 LONG_COMMENT_TERM = """
 term long-comment-term {
   comment:: "%s "
@@ -835,6 +841,10 @@ class CiscoTest(absltest.TestCase):
             'test-filter',
         )
 
+    def testUnnumberedProtocolName(self):
+        acl = cisco.Cisco(policy.ParsePolicy(GOOD_HEADER + GOOD_TERM_24, self.naming), EXP_INFO)
+        self.assertIn('permit pcp any any', str(acl), str(acl))
+
     @capture.stdout
     def testTermHopByHop(self):
         acl = cisco.Cisco(policy.ParsePolicy(GOOD_HEADER + GOOD_TERM_15, self.naming), EXP_INFO)
@@ -913,6 +923,12 @@ class CiscoTest(absltest.TestCase):
             self.assertNotIn('remark', str(acl), str(acl))
             print(acl)
 
+    def testHeaderCommentBlankLinesKept(self):
+        pol = policy.ParsePolicy(GOOD_HEADER + GOOD_TERM_7, self.naming)
+        pol.headers[0].comment = ['first line\n  \nthird line']
+        acl = cisco.Cisco(pol, EXP_INFO)
+        self.assertIn(' remark first line\n remark \n remark third line\n', str(acl), str(acl))
+
     @capture.stdout
     def testLongHeader(self):
         pol = policy.ParsePolicy(LONG_VERSION_HEADER + GOOD_TERM_7, self.naming)
@@ -62,6 +62,13 @@ term good-dst-term-3 {
     action:: accept
 }
 """
+GOOD_TERM_5 = """
+term good-src-dst-term {
+    source-address:: CORP
+    destination-address:: CORP
+    action:: accept
+}
+"""
 VERBATIM_TERM = """
 term verbatim-term {
     verbatim:: ciscoasa "foo bar"
@@ -188,6 +195,28 @@ class CiscoASATest(parameterized.TestCase):
         pol = ciscoasa.CiscoASA(policy.ParsePolicy(DSMO_HEADER + term, self.naming), EXP_INFO)
         self.assertIn(expected, str(pol))
 
+    def testSourceAndDestinationAddresses(self):
+        self.naming.GetNetAddr.return_value = [
+            nacaddr.IP('10.0.0.0/24'),
+            nacaddr.IP('10.1.1.1/32'),
+        ]
+        pol = str(
+            ciscoasa.CiscoASA(policy.ParsePolicy(GOOD_HEADER + GOOD_TERM_5, self.naming), EXP_INFO)
+        )
+        self.assertIn('permit ip 10.0.0.0 255.255.255.0 10.0.0.0 255.255.255.0', pol)
+        self.assertIn('permit ip 10.0.0.0 255.255.255.0 host 10.1.1.1', pol)
+        self.assertIn('permit ip host 10.1.1.1 host 10.1.1.1', pol)
+
+    def testSummarizedSourceAndHostDestination(self):
+        self.naming.GetNetAddr.side_effect = [
+            [nacaddr.IP('10.0.0.0/24'), nacaddr.IP('10.0.2.0/24')],
+            [nacaddr.IP('10.3.3.3/32')],
+        ]
+        pol = str(
+            ciscoasa.CiscoASA(policy.ParsePolicy(DSMO_HEADER + GOOD_TERM_5, self.naming), EXP_INFO)
+        )
+        self.assertIn('permit ip 10.0.0.0 255.255.253.0 host 10.3.3.3', pol)
+
 
 if __name__ == '__main__':
     absltest.main()
@@ -2,11 +2,23 @@
 # Modifications Copyright 2022-2023 Aerleon Project Authors.
 """Unittest for GCP Firewall Generator module."""
 
+import json
+
 from absl.testing import absltest, parameterized
 
 from aerleon.lib import gcp
 
 
+class FakeTerm:
+    """A term-like object whose attributes are set per instance."""
+
+    def __init__(self, action, **attrs):
+        self.action = action
+        self.name = 'fake-term'
+        for attr, value in attrs.items():
+            setattr(self, attr, value)
+
+
 class HelperFunctionsTest(parameterized.TestCase):
     @parameterized.named_parameters(
         ('lowercase', 'project'),
@@ -24,6 +36,8 @@ class HelperFunctionsTest(parameterized.TestCase):
         ('uppercase', 'Project'),
         ('too_short_by_one_char', 'proje'),
         ('too_long_by_one_char', 31 * 'a'),
+        ('underscore', 'project_id'),
+        ('non_ascii_letter', 'projéct'),
     )
     def testIsProjectIDValidFails(self, project):
         self.assertFalse(gcp.IsProjectIDValid(project))
@@ -45,6 +59,8 @@ class HelperFunctionsTest(parameterized.TestCase):
         ('uppercase', 'Vpc'),
         ('too_short_by_one_char', ''),
         ('too_long_by_one_char', 64 * 'a'),
+        ('underscore', 'v_pc'),
+        ('one_digit', '1'),
     )
     def testIsVPCNameValidFails(self, vpc):
         self.assertFalse(gcp.IsVPCNameValid(vpc))
@@ -57,6 +73,24 @@ class HelperFunctionsTest(parameterized.TestCase):
     def testGetIpv6TermName(self, term_name, expected):
         self.assertEqual(expected, gcp.GetIpv6TermName(term_name))
 
+    def testIsDefaultDenyChecksEachTermsInstanceAttributes(self):
+        plain_deny = FakeTerm(['deny'])
+        deny_with_ports = FakeTerm(['deny'], destination_port=['22'])
+        self.assertTrue(gcp.IsDefaultDeny(plain_deny))
+        self.assertFalse(gcp.IsDefaultDeny(deny_with_ports))
+        self.assertTrue(gcp.IsDefaultDeny(plain_deny))
+
+    @parameterized.named_parameters(
+        ('ascii', [{'name': 'term', 'ports': ['22', '80-81'], 'logging': True}]),
+        ('non_ascii', [{'description': 'caf\u00e9', 'priority': 1}]),
+        ('empty', []),
+        ('int_keys', [{1: 'one', 2: 'two'}]),
+        ('large_int', [{'priority': 2**70}]),
+    )
+    def testDumpJsonMatchesJsonModule(self, obj):
+        expected = json.dumps(obj, indent=2, separators=(',', ': '), sort_keys=True)
+        self.assertEqual(expected, gcp._DumpJson(obj))
+
 
 if __name__ == '__main__':
     absltest.main()
@@ -2508,6 +2508,19 @@ class GcpHfTest(parameterized.TestCase):
         self.assertEqual(expected, json.loads(self._StripAclHeaders(str(acl))))
         print(acl)
 
+    def testStrReflectsPolicyChanges(self):
+        """Test that the serialized policy follows changes to the policies."""
+        self.naming.GetNetAddr.return_value = ALL_IPV4_IPS
+
+        acl = gcp_hf.HierarchicalFirewall(
+            policy.ParsePolicy(HEADER_NO_OPTIONS + TERM_ALLOW_ALL_INTERNAL, self.naming), EXP_INFO
+        )
+        self.assertEqual(str(acl), str(acl))
+        acl.policies[0]['rules'][0]['priority'] = 4242
+        self.assertIn('"priority": 4242', str(acl))
+        acl.policies = []
+        self.assertEqual('[]\n\n', str(acl))
+
     @capture.stdout
     def testOptionMaxHeader(self):
         """Test that a header with a default maximum cost is accepted."""
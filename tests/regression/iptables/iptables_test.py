@@ -618,6 +618,18 @@ class AclCheckTest(absltest.TestCase):
         )
         print(result)
 
+    def testAddressesCalculatedOnce(self):
+        acl = iptables.Iptables(
+            policy.ParsePolicy(GOOD_HEADER_2 + GOOD_TERM_1, self.naming), EXP_INFO
+        )
+        term = acl.iptables_policies[0][4][0]
+        with mock.patch.object(
+            term, '_CalculateAddresses', wraps=term._CalculateAddresses
+        ) as calculate_addresses:
+            term.RenderLines()
+            term.RenderLines()
+        calculate_addresses.assert_called_once()
+
     @capture.stdout
     def testCustomChain(self):
         acl = iptables.Iptables(
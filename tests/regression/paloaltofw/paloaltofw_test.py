@@ -14,7 +14,10 @@
 # limitations under the License.
 """Unit test for Palo Alto Firewalls acl rendering module."""
 
+import sys
+import xml.etree.ElementTree as etree
 from unittest import mock
+from xml.dom import minidom
 
 from absl.testing import absltest
 
@@ -590,6 +593,107 @@ class PaloAltoFWTest(absltest.TestCase):
         self.naming.GetServiceByProto.assert_called_once_with('SMTP', 'tcp')
         print(output)
 
+    @mock.patch.object(paloaltofw.PaloAltoFW, '_MAX_RULE_SRC_DST_MEMBERS', 0)
+    def testMaxDestinationMembers(self):
+        self.naming.GetNetAddr.return_value = _IPSET
+        self.naming.GetServiceByProto.return_value = ['25']
+
+        paloalto = paloaltofw.PaloAltoFW(
+            policy.ParsePolicy(GOOD_HEADER_1 + GOOD_TERM_1, self.naming), EXP_INFO
+        )
+        self.assertRaisesRegex(
+            paloaltofw.UnsupportedFilterError,
+            'destination members exceeds maximum of 0: 1',
+            str,
+            paloalto,
+        )
+
+    def testPrettyXmlMatchesMinidom(self):
+        config = etree.Element("config", {"urldb": "paloaltonetworks", "version": "8.1.0"})
+        entry = etree.SubElement(config, "entry", {"name": 'a"b&c<d>e'})
+        etree.SubElement(entry, "description").text = "x & y < z > w\r\nnext line"
+        etree.SubElement(entry, "empty").text = ""
+        etree.SubElement(entry, "static")
+        config.append(etree.Comment(" Rules "))
+        etree.SubElement(config, "member").text = "any"
+
+        expected = minidom.parseString(etree.tostring(config, encoding="UTF-8")).toprettyxml(
+            indent=paloaltofw.PaloAltoFW.INDENT
+        )
+        out = ['<?xml version="1.0" ?>\n']
+        paloaltofw._WritePrettyXml(config, "", paloaltofw.PaloAltoFW.INDENT, out)
+        self.assertEqual(expected, "".join(out))
+
+    @absltest.skipIf(
+        sys.version_info < (3, 13), "minidom writes whitespace in attributes raw before 3.13"
+    )
+    def testPrettyXmlAttributeWhitespaceMatchesMinidom(self):
+        config = etree.Element("config", {"name": "a\tb\nc\rd"})
+
+        expected = minidom.parseString(etree.tostring(config, encoding="UTF-8")).toprettyxml(
+            indent=paloaltofw.PaloAltoFW.INDENT
+        )
+        out = ['<?xml version="1.0" ?>\n']
+        paloaltofw._WritePrettyXml(config, "", paloaltofw.PaloAltoFW.INDENT, out)
+        self.assertEqual(expected, "".join(out))
+
+    def testPrettyXmlAttributeWhitespaceRoundTrips(self):
+        config = etree.Element("config", {"name": "a\tb\nc\rd"})
+
+        out = []
+        paloaltofw._WritePrettyXml(config, "", "  ", out)
+        self.assertEqual("a\tb\nc\rd", etree.fromstring("".join(out)).get("name"))
+
+    def testPrettyXml(self):
+        config = etree.Element("config", {"urldb": "paloaltonetworks", "version": "8.1.0"})
+        entry = etree.SubElement(config, "entry", {"name": 'a"b&c<d>e\tf\ng\rh'})
+        etree.SubElement(entry, "description").text = 'x & y < z > "w"\r\nnext line'
+        etree.SubElement(entry, "empty").text = ""
+        etree.SubElement(entry, "static")
+        config.append(etree.Comment(" Rules "))
+        etree.SubElement(config, "member").text = "any"
+
+        out = []
+        paloaltofw._WritePrettyXml(config, "", "  ", out)
+        self.assertEqual(
+            '<config urldb="paloaltonetworks" version="8.1.0">\n'
+            '  <entry name="a&quot;b&amp;c&lt;d&gt;e&#9;f&#10;g&#13;h">\n'
+            '    <description>x &amp; y &lt; z &gt; &quot;w&quot;\nnext line</description>\n'
+            '    <empty/>\n'
+            '    <static/>\n'
+            '  </entry>\n'
+            '  <!-- Rules -->\n'
+            '  <member>any</member>\n'
+            '</config>\n',
+            "".join(out),
+        )
+
+    def testPrettyXmlTextWithChildren(self):
+        config = etree.Element("config")
+        config.text = "before & "
+        entry = etree.SubElement(config, "entry")
+        entry.text = "inside"
+        etree.SubElement(entry, "static")
+        entry.tail = "after <entry>"
+        config.append(etree.Comment(" Rules "))
+        config[-1].tail = "after comment"
+
+        out = []
+        paloaltofw._WritePrettyXml(config, "", "  ", out)
+        self.assertEqual(
+            '<config>\n'
+            '  before &amp; \n'
+            '  <entry>\n'
+            '    inside\n'
+            '    <static/>\n'
+            '  </entry>\n'
+            '  after &lt;entry&gt;\n'
+            '  <!-- Rules -->\n'
+            '  after comment\n'
+            '</config>\n',
+            "".join(out),
+        )
+
     @capture.stdout
     def testServiceMap(self):
         definitions = naming.Naming()
@@ -620,6 +724,33 @@ class PaloAltoFWTest(absltest.TestCase):
         self.assertEqual(pol2.service_map.entries, expected_entries, pol2.service_map.entries)
         print(pol2)
 
+    def testServiceMapDuplicateName(self):
+        service_map = paloaltofw.ServiceMap()
+        service_map.get_service_name('term-1', (), ('22',), 'tcp')
+        self.assertEqual(
+            service_map.get_service_name('term-1', (), ('22',), 'tcp'), 'service-term-1-tcp'
+        )
+        self.assertRaises(
+            paloaltofw.PaloAltoFWDuplicateServiceError,
+            service_map.get_service_name,
+            'term-1',
+            (),
+            ('25',),
+            'tcp',
+        )
+
+    def testSortAddressBookNumCheck(self):
+        self.naming.GetNetAddr.return_value = _IPSET
+        self.naming.GetServiceByProto.return_value = ['25']
+
+        pol = policy.ParsePolicy(GOOD_HEADER_1 + GOOD_TERM_1, self.naming)
+        paloalto = paloaltofw.PaloAltoFW(pol, EXP_INFO)
+        names = ['FOO_BAR_10', 'FOO_BAR_2', 'FOO_1', 'FOO_BAR_1']
+        self.assertEqual(
+            sorted(names, key=paloalto._SortAddressBookNumCheck),
+            ['FOO_1', 'FOO_BAR_1', 'FOO_BAR_2', 'FOO_BAR_10'],
+        )
+
     @capture.stdout
     def testDefaultDeny(self):
         paloalto = paloaltofw.PaloAltoFW(
@@ -1242,6 +1373,27 @@ term rule-1 {
         x = paloalto.config.findtext(PATH_RULES + "/entry[@name='rule-1']/description")
         self.assertEqual(x, 'C' * MAX_RULE_DESCRIPTION_LENGTH, output)
 
+    def testMixedAddressFamilyWarning(self):
+        TERM = """
+term mixed-af {
+  source-address:: FOO
+  destination-address:: BAR
+  protocol:: tcp
+  action:: accept
+}
+"""
+        self.naming.GetNetAddr.side_effect = [
+            [nacaddr.IP('10.0.0.0/8')],
+            [nacaddr.IP('2001:4860:8000::/33')],
+        ]
+        pol = policy.ParsePolicy(GOOD_HEADER_MIXED + TERM, self.naming)
+
+        with self.assertLogs(level='WARN') as log:
+            paloaltofw.PaloAltoFW(pol, EXP_INFO)
+        self.assertEqual(len(log.output), 1, log.output)
+        self.assertIn('different address families', log.output[0])
+        self.assertIn("['ip4-src-only', 'ip6-dst-only']", log.output[0])
+
     @capture.stdout
     def testTermLen(self):
         TERM = """